@@ -1,3 +1,7 @@
+import matplotlib
+# 所有图表都直接保存为文件，固定使用非交互的 Agg 后端
+matplotlib.use('Agg')
+
 from .market import MarketAnalyzer
 
 
@@ -0,0 +1,181 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def price_stats(prices, fundamentals):
+    """
+    单次遍历价格序列，同时计算价格偏离度与对数收益率波动率
+
+    Args:
+        prices: 市场价格序列
+        fundamentals: 基础价格序列（按两者较短的长度计算偏离度）
+
+    Returns:
+        (平均相对偏离 |p - f| / f, 对数收益率标准差)
+    """
+    n = prices.shape[0]
+    m = min(n, fundamentals.shape[0])
+
+    deviation_sum = 0.0
+    for i in range(m):
+        deviation_sum += abs(prices[i] - fundamentals[i]) / fundamentals[i]
+    mean_deviation = deviation_sum / m if m > 0 else np.nan
+
+    # Welford 在线方差：r_i = log(p_i / p_{i-1})
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    for i in range(1, n):
+        r = np.log(prices[i] / prices[i - 1])
+        count += 1
+        delta = r - mean
+        mean += delta / count
+        m2 += delta * (r - mean)
+    std = np.sqrt(m2 / count) if count > 0 else np.nan
+
+    return mean_deviation, std
+
+
+@njit(cache=True)
+def mean_std(x):
+    """
+    Welford 单次遍历同时计算均值与总体标准差（ddof=0，与 np.std 一致）
+
+    Returns:
+        (均值, 标准差)，空序列返回 (nan, nan)
+    """
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    for i in range(x.shape[0]):
+        count += 1
+        delta = x[i] - mean
+        mean += delta / count
+        m2 += delta * (x[i] - mean)
+    if count == 0:
+        return np.nan, np.nan
+    return mean, np.sqrt(m2 / count)
+
+
+@njit(cache=True)
+def rolling_std(x, window):
+    """
+    滑动窗口样本标准差（ddof=1），窗口满之前的位置为 NaN
+
+    窗口移动时用 Welford 增删公式原位更新均值与平方和，避免前缀和相减的精度损失。
+    """
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    if window < 2 or n < window:
+        return out
+
+    mean = 0.0
+    m2 = 0.0
+    for i in range(window):
+        delta = x[i] - mean
+        mean += delta / (i + 1)
+        m2 += delta * (x[i] - mean)
+    out[window - 1] = np.sqrt(max(m2 / (window - 1), 0.0))
+
+    for i in range(window, n):
+        new = x[i]
+        old = x[i - window]
+        old_mean = mean
+        mean += (new - old) / window
+        m2 += (new - old) * (new - mean + old - old_mean)
+        out[i] = np.sqrt(max(m2 / (window - 1), 0.0))
+    return out
+
+
+@njit(cache=True)
+def max_drawdown(r):
+    """单次遍历累乘 (1 + r) 并跟踪历史峰值，返回最大回撤（非正数）"""
+    cum = 1.0
+    peak = -np.inf  # 峰值从第一期净值起算，与 maximum.accumulate 一致
+    mdd = 0.0
+    for i in range(r.shape[0]):
+        cum *= 1.0 + r[i]
+        if cum > peak:
+            peak = cum
+        dd = (cum - peak) / peak
+        if dd < mdd:
+            mdd = dd
+    return mdd
+
+
+@njit(cache=True)
+def moments(x):
+    """
+    单次遍历计算前四阶矩（Pébay 在线更新）
+
+    偏度、峰度采用与 pandas Series.skew()/kurtosis() 相同的无偏修正，
+    峰度为超额峰度；样本不足（偏度 n<3、峰度 n<4）时为 NaN，零方差时为 0。
+
+    Returns:
+        (均值, 总体标准差, 偏度, 峰度)
+    """
+    n = 0
+    mean = 0.0
+    m2 = 0.0
+    m3 = 0.0
+    m4 = 0.0
+    for i in range(x.shape[0]):
+        n1 = n
+        n += 1
+        delta = x[i] - mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term1 = delta * delta_n * n1
+        mean += delta_n
+        m4 += term1 * delta_n2 * (n * n - 3 * n + 3) + 6.0 * delta_n2 * m2 - 4.0 * delta_n * m3
+        m3 += term1 * delta_n * (n - 2) - 3.0 * delta_n * m2
+        m2 += term1
+
+    if n == 0:
+        return np.nan, np.nan, np.nan, np.nan
+    std = np.sqrt(m2 / n)
+
+    skew = np.nan
+    if n >= 3:
+        if m2 == 0.0:
+            skew = 0.0
+        else:
+            g1 = np.sqrt(n) * m3 / m2 ** 1.5
+            skew = np.sqrt(n * (n - 1.0)) / (n - 2.0) * g1
+
+    kurt = np.nan
+    if n >= 4:
+        if m2 == 0.0:
+            kurt = 0.0
+        else:
+            numer = n * (n + 1.0) * (n - 1.0) * m4
+            denom = (n - 2.0) * (n - 3.0) * m2 * m2
+            adj = 3.0 * (n - 1.0) ** 2 / ((n - 2.0) * (n - 3.0))
+            kurt = numer / denom - adj
+
+    return mean, std, skew, kurt
+
+
+@njit(cache=True)
+def sorted_mean_gini(s):
+    """
+    对已升序排列的财富序列单次遍历，同时得到均值与基尼系数
+
+    G = (n + 1) / n - 2 * sum((n - i + 1) * x_i) / (mu * n^2)
+
+    Returns:
+        (均值, 基尼系数)，空序列返回 (nan, nan)；财富全为 0 时视为完全平等，基尼系数为 0
+    """
+    n = s.shape[0]
+    if n == 0:
+        return np.nan, np.nan
+    total = 0.0
+    weighted = 0.0
+    for i in range(n):
+        total += s[i]
+        weighted += (n - i) * s[i]
+    mu = total / n
+    if total == 0.0:
+        return mu, 0.0
+    return mu, (n + 1.0) / n - 2.0 * weighted / (mu * n * n)
@@ -1,3 +1,8 @@
+import os
+import random
+import logging
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from src.traders.retail import RetailTrader
 from src.traders.institutional import InstitutionalTrader
 from src.market.structure import Market
@@ -7,11 +12,16 @@ from src.config.loader import load_config
 
 def run_scenario(enable_cyberbullying: bool, config_path="config.yaml", seed=None, max_timesteps=None):
     config = load_config(config_path)
+    if config["simulation"].get("verbose", False):
+        # 逐步调试输出：市场模块的 logger 调到 DEBUG（默认不输出，热路径不做格式化）
+        logging.basicConfig(format="%(message)s")
+        logging.getLogger("src.market").setLevel(logging.DEBUG)
     if max_timesteps is not None:
         config["market"]["max_timesteps"] = max_timesteps
     if seed is not None:
         import numpy as np
         np.random.seed(seed)
+        random.seed(seed)
     agents = []
     n_retail = int(config["agents"]["count"] * config["agents"]["retail_ratio"])
     n_institutional = config["agents"]["count"] - n_retail
@@ -24,11 +34,39 @@ def run_scenario(enable_cyberbullying: bool, config_path="config.yaml", seed=Non
     if enable_cyberbullying:
         cyberbullying_model = CyberbullyingModel(config, agents)
         cyberbullying_model.build_network()
-    market = Market(orderbook, config["market"]["max_timesteps"], config, cyberbullying_model)
+    market = Market(orderbook, config["market"]["max_timesteps"], config, cyberbullying_model, seed=seed)
     for agent in agents:
         market.register_agent(agent)
     initial_agents = [agent.copy() for agent in agents]
     initial_price = market.fundamental_price
     market.run()
     final_price = market.price_history[-1] if market.price_history else market.fundamental_price
-    return initial_agents, agents, initial_price, final_price, market 
\ No newline at end of file
+    return initial_agents, agents, initial_price, final_price, market 
+
+def skip_existing_figure(path, overwrite=True):
+    """增量模式（overwrite=False）下图像文件已存在时返回 True，调用方据此跳过重绘"""
+    return not overwrite and os.path.exists(path)
+
+def _run_pair(seed, index=None, reducer=None):
+    """
+    同一种子下依次运行 baseline 与网暴场景（进程池任务）。
+    index 指定时只保留该项结果，reducer 指定时再对其做汇总后回传
+    """
+    results = (run_scenario(False, seed=seed), run_scenario(True, seed=seed))
+    if index is not None:
+        results = tuple(result[index] for result in results)
+    if reducer is not None:
+        results = tuple(reducer(result) for result in results)
+    return results
+
+def run_paired_scenarios(seeds, max_workers=None, index=None, reducer=None):
+    """
+    多进程并行运行配对实验，按 seeds 顺序逐个产出 (baseline结果, 网暴结果)。
+    每个结果与 run_scenario 的返回值相同；若给定 index，则只产出返回值中的该项
+    （如 4 表示市场对象），减少子进程回传时的序列化开销。
+    reducer 为模块级函数（需可 pickle），在子进程内作用于每个结果，
+    只回传汇总后的轻量数据。
+    各次实验相互独立，种子固定即可复现。
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(partial(_run_pair, index=index, reducer=reducer), seeds)
\ No newline at end of file
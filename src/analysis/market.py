@@ -1,121 +1,152 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from typing import List, Dict, Tuple, Optional
 from src.social.cyberbullying import CyberbullyingModel
 from scipy.stats import gaussian_kde
 from src.market.structure import Market
-# 关闭交互模式
-plt.ioff()
+from src.analysis._kernels import price_stats, mean_std, rolling_std, max_drawdown, moments
+from src.analysis.experiment_utils import skip_existing_figure
+
+# 拟合核密度估计时使用的最大样本数
+KDE_MAX_SAMPLES = 10000
 
 class MarketAnalyzer:
     def __init__(self, market: Market, cyberbullying_model: Optional[CyberbullyingModel] = None):
         self.market = market
         self.orderbook = market.orderbook
         self.cyberbullying_model = cyberbullying_model
-        self.price_history = market.price_history
-        self.fundamental_price_history = market.fundamental_price_history
-        self.log_returns = np.array(market.log_returns)
+        # 历史序列在构造时一次性转为 float64 数组，供各项指标与绘图复用
+        self.price_history = np.ascontiguousarray(market.price_history, dtype=np.float64)
+        self.fundamental_price_history = np.ascontiguousarray(market.fundamental_price_history, dtype=np.float64)
+        self.log_returns = np.ascontiguousarray(market.log_returns, dtype=np.float64)
         self.bid_ask_spreads = market.bid_ask_spreads
         self.order_depths = market.order_depths
         self.amihud_illiquidity = market.amihud_illiquidity
+        # 基于快照的统计量首次使用时计算并缓存（None 表示尚未计算）
+        self._cached_mean_std = None
+        self._cached_bounds = None
+        self._cached_metrics = None
+
+    @property
+    def _return_mean_std(self) -> Tuple[float, float]:
+        """收益率均值与标准差，报告与各绘图共用，只计算一次"""
+        if self._cached_mean_std is None:
+            self._cached_mean_std = mean_std(self.log_returns)
+        return self._cached_mean_std
+
+    @property
+    def _return_bounds(self) -> Tuple[float, float]:
+        """收益率最小值与最大值（收益率快照不变，绘图时复用）"""
+        if self._cached_bounds is None:
+            if self.log_returns.size == 0:
+                self._cached_bounds = (np.nan, np.nan)
+            else:
+                self._cached_bounds = (float(self.log_returns.min()), float(self.log_returns.max()))
+        return self._cached_bounds
 
     def _calculate_rolling_volatility(self, window: int = 20) -> np.ndarray:
-        """计算滚动波动率"""
-        log_returns = pd.Series(self.log_returns)
-        return log_returns.rolling(window=window, min_periods=window).std() * np.sqrt(252)
+        """计算滚动波动率（单次遍历滑动窗口，前 window-1 个位置为 NaN）"""
+        return rolling_std(self.log_returns, window) * np.sqrt(252)
 
-    def _plot_time_series(self, data: np.ndarray, title: str, xlabel: str, ylabel: str, 
+    def _plot_time_series(self, ax, data: np.ndarray, title: str, xlabel: str, ylabel: str, 
                          color: str = 'blue', label: str = None, grid: bool = True) -> None:
-        """绘制时间序列图"""
-        plt.plot(data, color=color, label=label)
-        plt.title(title)
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
+        """在指定坐标轴上绘制时间序列图"""
+        ax.plot(data, color=color, label=label)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
         if label:
-            plt.legend()
+            ax.legend()
         if grid:
-            plt.grid(True, alpha=0.3)
-
-    def _plot_histogram_with_kde(self, data: np.ndarray, title: str, xlabel: str, ylabel: str,
-                                bins: int = 60, color: str = 'orange', alpha: float = 0.7) -> None:
-        """绘制直方图和核密度估计"""
-        mean = np.mean(data)
-        std = np.std(data)
+            ax.grid(True, alpha=0.3)
+
+    def _plot_histogram_with_kde(self, ax, data: np.ndarray, title: str, xlabel: str, ylabel: str,
+                                bins: int = 60, color: str = 'orange', alpha: float = 0.7,
+                                stats: Optional[Tuple[float, float]] = None) -> None:
+        """绘制直方图和核密度估计（stats 为已算好的 (均值, 标准差)，缺省时现算）"""
+        if stats is None:
+            stats = mean_std(np.ascontiguousarray(data, dtype=np.float64))
+        mean, std = stats
         range_min = mean - 2 * std
         range_max = mean + 2 * std
         filtered_data = data[(data >= range_min) & (data <= range_max)]
         
-        plt.hist(filtered_data, bins=bins, density=True, color=color, alpha=alpha, label='Histogram')
+        ax.hist(filtered_data, bins=bins, density=True, color=color, alpha=alpha, label='Histogram')
         if len(filtered_data) > 1:
-            kde = gaussian_kde(filtered_data)
+            # KDE 代价与样本数成正比，长序列固定种子抽样后拟合，直方图仍用全部数据
+            fit_data = filtered_data
+            if fit_data.size > KDE_MAX_SAMPLES:
+                idx = np.random.default_rng(0).choice(fit_data.size, KDE_MAX_SAMPLES, replace=False)
+                fit_data = fit_data[idx]
+            kde = gaussian_kde(fit_data)
             x_grid = np.linspace(range_min, range_max, 500)
-            plt.plot(x_grid, kde(x_grid), color='red', lw=2, label='KDE')
-        
-        plt.title(title)
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
-        plt.xlim(range_min, range_max)
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-
-    def plot_price_evolution(self, save_path: str = None):
-        """绘制价格演化图"""
-        plt.figure(figsize=(12, 6))
-        self._plot_time_series(self.price_history, 'Price Evolution', 'Time Step', 'Price', 
+            ax.plot(x_grid, kde(x_grid), color='red', lw=2, label='KDE')
+        
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.set_xlim(range_min, range_max)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+
+    def plot_price_evolution(self, save_path: str = None, overwrite: bool = True):
+        """绘制价格演化图（overwrite=False 时已存在的图像不再重绘）"""
+        if not save_path:
+            # 图像不显示，不保存则不会被使用，直接跳过绘制
+            return
+        if skip_existing_figure(f"results/market/{save_path}", overwrite):
+            return
+        fig = Figure(figsize=(12, 6))
+        ax = fig.add_subplot()
+        self._plot_time_series(ax, self.price_history, 'Price Evolution', 'Time Step', 'Price', 
                              color='blue', label='Market Price')
-        self._plot_time_series(self.fundamental_price_history, 'Price Evolution', 'Time Step', 'Price',
+        self._plot_time_series(ax, self.fundamental_price_history, 'Price Evolution', 'Time Step', 'Price',
                              color='red', label='Fundamental Price', grid=False)
-        plt.legend()
+        ax.legend()
         
-        if save_path:
-            plt.savefig(f"results/market/{save_path}")
-        plt.close()
+        fig.savefig(f"results/market/{save_path}")
         
-    def plot_returns_distribution(self, save_path: str = None):
+    def plot_returns_distribution(self, save_path: str = None, overwrite: bool = True):
         """绘制收益率时间序列图"""
-        plt.figure(figsize=(12, 6))
-        self._plot_time_series(self.log_returns, 'Log Returns Over Time', 'Time Step', 'Log Return')
-        plt.axhline(y=0, color='black', linestyle='--', alpha=0.3)
+        if not save_path or skip_existing_figure(f"results/market/{save_path}", overwrite):
+            return
+        fig = Figure(figsize=(12, 6))
+        ax = fig.add_subplot()
+        self._plot_time_series(ax, self.log_returns, 'Log Returns Over Time', 'Time Step', 'Log Return')
+        ax.axhline(y=0, color='black', linestyle='--', alpha=0.3)
         
         # 添加统计信息
-        mean_return = np.mean(self.log_returns)
-        std_return = np.std(self.log_returns)
-        plt.axhline(y=mean_return, color='red', linestyle='--', label=f'Mean: {mean_return:.4f}')
-        plt.axhline(y=mean_return + std_return, color='green', linestyle=':', label=f'±1 Std: {std_return:.4f}')
-        plt.axhline(y=mean_return - std_return, color='green', linestyle=':')
-        plt.legend()
+        mean_return, std_return = self._return_mean_std
+        ax.axhline(y=mean_return, color='red', linestyle='--', label=f'Mean: {mean_return:.4f}')
+        ax.axhline(y=mean_return + std_return, color='green', linestyle=':', label=f'±1 Std: {std_return:.4f}')
+        ax.axhline(y=mean_return - std_return, color='green', linestyle=':')
+        ax.legend()
         
-        if save_path:
-            plt.savefig(f"results/market/{save_path}")
-        plt.close()
+        fig.savefig(f"results/market/{save_path}")
         
     def calculate_market_metrics(self) -> Dict[str, float]:
-        """计算市场指标"""
-        # 确保价格历史长度一致
-        min_length = min(len(self.price_history), len(self.fundamental_price_history))
-        price_history = np.array(self.price_history[:min_length], dtype=float)
-        fundamental_price_history = np.array(self.fundamental_price_history[:min_length], dtype=float)
-        log_returns = np.array(self.log_returns, dtype=float)
-        
-        # 计算波动率
-        volatility = np.std(log_returns) * np.sqrt(252)  # 年化波动率
+        """计算市场指标（首次调用后缓存，返回副本）"""
+        if self._cached_metrics is None:
+            self._cached_metrics = self._compute_market_metrics()
+        return dict(self._cached_metrics)
+
+    def _compute_market_metrics(self) -> Dict[str, float]:
+        """分析器持有的是模拟结束后的快照，指标只需计算一次"""
+        log_returns = self.log_returns
         
-        # 计算价格偏离
-        price_deviation = np.mean(np.abs(price_history - fundamental_price_history) / fundamental_price_history)
+        # 单次遍历计算价格偏离与波动率（偏离度按两段历史的较短长度对齐）
+        price_deviation, return_std = price_stats(self.price_history, self.fundamental_price_history)
+        volatility = return_std * np.sqrt(252)  # 年化波动率
         
-        # 计算自相关性
-        autocorr = np.corrcoef(log_returns[:-1], log_returns[1:])[0, 1]
+        # 计算一阶自相关性（中心化后的滞后点积，免去 corrcoef 的协方差矩阵）
+        centered = log_returns - self._return_mean_std[0]
+        autocorr = float(np.dot(centered[:-1], centered[1:]) / np.dot(centered, centered))
         
-        # 计算偏度和峰度
-        skewness = pd.Series(log_returns).skew()
-        kurtosis = pd.Series(log_returns).kurtosis()
+        # 计算偏度和峰度（单次遍历，修正方式与 pandas 一致）
+        _, _, skewness, kurtosis = moments(log_returns)
         
-        # 计算最大回撤
-        cumulative_returns = np.cumprod(1 + log_returns)
-        rolling_max = np.maximum.accumulate(cumulative_returns)
-        drawdowns = (cumulative_returns - rolling_max) / rolling_max
-        max_drawdown = np.min(drawdowns)
+        # 计算最大回撤（累乘、峰值与回撤合并为一次遍历）
+        max_dd = max_drawdown(log_returns)
 
         # 获取流动性指标
         liquidity_metrics = self.market.get_liquidity_metrics()
@@ -126,64 +157,63 @@ class MarketAnalyzer:
             'autocorrelation': autocorr,
             'skewness': skewness,
             'kurtosis': kurtosis,
-            'max_drawdown': max_drawdown,
+            'max_drawdown': max_dd,
             'bid_ask_spread': liquidity_metrics['bid_ask_spread'],
             'order_depth': liquidity_metrics['order_depth'],
             'amihud_illiquidity': liquidity_metrics['amihud_illiquidity']
         }
         
-    def plot_volatility_evolution(self, window: int = 20, save_path: str = None):
+    def plot_volatility_evolution(self, window: int = 20, save_path: str = None, overwrite: bool = True):
         """绘制波动率演化图"""
+        if not save_path or skip_existing_figure(save_path, overwrite):
+            return
         rolling_vol = self._calculate_rolling_volatility(window)
         
-        plt.figure(figsize=(12, 6))
-        self._plot_time_series(rolling_vol, f'Rolling Volatility ({window}-day window)', 
+        fig = Figure(figsize=(12, 6))
+        self._plot_time_series(fig.add_subplot(), rolling_vol, f'Rolling Volatility ({window}-day window)', 
                              'Time Step', 'Annualized Volatility', color='green')
         
-        if save_path:
-            plt.savefig(save_path)
-        plt.close()
+        fig.savefig(save_path)
 
-    def plot_analysis(self, save_path: str = None, window: int = 200):
+    def plot_analysis(self, save_path: str = None, window: int = 200, overwrite: bool = True):
         """绘制综合分析图"""
-        plt.figure(figsize=(15, 10))
+        if not save_path or skip_existing_figure(save_path, overwrite):
+            return
+        fig = Figure(figsize=(15, 10))
+        (ax_price, ax_returns), (ax_dist, ax_vol) = fig.subplots(2, 2)
 
         # 1. 价格走势
-        plt.subplot(2, 2, 1)
-        self._plot_time_series(self.price_history, "Price Evolution", "Time", "Price", 
+        self._plot_time_series(ax_price, self.price_history, "Price Evolution", "Time", "Price", 
                              color='blue', label="Market Price")
-        self._plot_time_series(self.fundamental_price_history, "Price Evolution", "Time", "Price",
+        self._plot_time_series(ax_price, self.fundamental_price_history, "Price Evolution", "Time", "Price",
                              color='red', label="Fundamental Price", grid=False)
-        plt.legend()
+        ax_price.legend()
 
         # 2. 收益率变化（时间序列）
-        plt.subplot(2, 2, 2)
-        self._plot_time_series(self.log_returns, "Log Returns Over Time", "Time", "Log Return",
+        self._plot_time_series(ax_returns, self.log_returns, "Log Returns Over Time", "Time", "Log Return",
                              color='purple')
-        plt.axhline(y=0, color='black', linestyle='--', alpha=0.3)
-        ymin, ymax = self.log_returns.min(), self.log_returns.max()
+        ax_returns.axhline(y=0, color='black', linestyle='--', alpha=0.3)
+        ymin, ymax = self._return_bounds
         yrange = ymax - ymin
-        plt.ylim(ymin - 0.1*yrange, ymax + 0.1*yrange)
+        ax_returns.set_ylim(ymin - 0.1*yrange, ymax + 0.1*yrange)
 
         # 3. 收益率分布
-        plt.subplot(2, 2, 3)
-        self._plot_histogram_with_kde(self.log_returns, "Return Distribution", 
-                                    "Log Return", "Probability Density")
+        self._plot_histogram_with_kde(ax_dist, self.log_returns, "Return Distribution", 
+                                    "Log Return", "Probability Density",
+                                    stats=self._return_mean_std)
 
         # 4. 波动率集聚
-        plt.subplot(2, 2, 4)
         rolling_vol = self._calculate_rolling_volatility(window)
-        self._plot_time_series(rolling_vol, f"Rolling Volatility ({window}-step)", 
+        self._plot_time_series(ax_vol, rolling_vol, f"Rolling Volatility ({window}-step)", 
                              "Time", "Annualized Volatility", color='green')
 
-        plt.tight_layout()
-        if save_path:
-            plt.savefig(save_path)
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(save_path)
 
     def generate_report(self) -> str:
         """生成市场分析报告"""
         metrics = self.calculate_market_metrics()
+        mean_return, std_return = self._return_mean_std
         
         report = f"""
 Market Analysis Report
@@ -203,8 +233,8 @@ Market Analysis Report
 - Initial Price: {self.price_history[0]:.2f}
 - Final Price: {self.price_history[-1]:.2f}
 - Total Return: {(self.price_history[-1] / self.price_history[0] - 1) * 100:.2f}%
-- Average Daily Return: {np.mean(self.log_returns) * 100:.4f}%
-- Return Volatility: {np.std(self.log_returns) * 100:.4f}%
+- Average Daily Return: {mean_return * 100:.4f}%
+- Return Volatility: {std_return * 100:.4f}%
 
 """
         return report 
\ No newline at end of file
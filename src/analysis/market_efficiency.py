@@ -2,114 +2,52 @@ import os
 import numpy as np
 import pandas as pd
 from scipy.stats import ttest_rel
-from src.analysis.experiment_utils import run_scenario
+from src.analysis.experiment_utils import run_paired_scenarios, skip_existing_figure
 from src.config.loader import load_config
 from src.analysis.market import MarketAnalyzer
-from matplotlib import pyplot as plt
-
-def run_market_efficiency_analysis_multi(baseline_markets, cyber_markets, save_dir='thesis/image'):
-    """运行多次实验的市场效率分析"""
+from matplotlib.figure import Figure
+
+# (表格中的指标名, calculate_market_metrics 中的键)
+EFFICIENCY_METRICS = [
+    ('收益波动率', 'volatility'),
+    ('买卖价差', 'bid_ask_spread'),
+    ('市场深度', 'order_depth'),
+    ('Amihud非流动性', 'amihud_illiquidity'),
+    ('价格偏离度', 'price_deviation'),
+]
+
+def _metric_matrix(markets):
+    """逐个市场计算一次市场指标，返回 (实验次数, 指标数) 矩阵，列顺序同 EFFICIENCY_METRICS"""
+    matrix = np.empty((len(markets), len(EFFICIENCY_METRICS)))
+    for i, market in enumerate(markets):
+        metrics = MarketAnalyzer(market).calculate_market_metrics()
+        for j, (_, key) in enumerate(EFFICIENCY_METRICS):
+            matrix[i, j] = metrics[key]
+    return matrix
+
+def run_market_efficiency_analysis_multi(baseline_markets, cyber_markets, save_dir='thesis/image', overwrite=True):
+    """运行多次实验的市场效率分析（overwrite=False 时已存在的图像不再重绘，检验结果照常保存）"""
     os.makedirs(save_dir, exist_ok=True)
     results = []
 
-    # 1. 收益波动率分析
-    baseline_volatility = []
-    cyber_volatility = []
-    for base_market, cyber_market in zip(baseline_markets, cyber_markets):
-        base_analyzer = MarketAnalyzer(base_market)
-        cyber_analyzer = MarketAnalyzer(cyber_market)
-        base_metrics = base_analyzer.calculate_market_metrics()
-        cyber_metrics = cyber_analyzer.calculate_market_metrics()
-        baseline_volatility.append(base_metrics['volatility'])
-        cyber_volatility.append(cyber_metrics['volatility'])
-    t_stat_vol, p_val_vol = ttest_rel(baseline_volatility, cyber_volatility)
-    results.append({
-        'metric': '收益波动率',
-        't_stat': t_stat_vol,
-        'p_val': p_val_vol,
-        'baseline_mean': np.mean(baseline_volatility),
-        'cyber_mean': np.mean(cyber_volatility)
-    })
-    print("配对t检验：收益波动率分析完成")
-
-    # 2. 流动性指标分析
-    # 2.1 Bid-Ask Spread
-    baseline_spread = []
-    cyber_spread = []
-    for base_market, cyber_market in zip(baseline_markets, cyber_markets):
-        base_analyzer = MarketAnalyzer(base_market)
-        cyber_analyzer = MarketAnalyzer(cyber_market)
-        base_metrics = base_analyzer.calculate_market_metrics()
-        cyber_metrics = cyber_analyzer.calculate_market_metrics()
-        baseline_spread.append(base_metrics['bid_ask_spread'])
-        cyber_spread.append(cyber_metrics['bid_ask_spread'])
-    t_stat_spread, p_val_spread = ttest_rel(baseline_spread, cyber_spread)
-    results.append({
-        'metric': '买卖价差',
-        't_stat': t_stat_spread,
-        'p_val': p_val_spread,
-        'baseline_mean': np.mean(baseline_spread),
-        'cyber_mean': np.mean(cyber_spread)
-    })
-
-    # 2.2 Market Depth
-    baseline_depth = []
-    cyber_depth = []
-    for base_market, cyber_market in zip(baseline_markets, cyber_markets):
-        base_analyzer = MarketAnalyzer(base_market)
-        cyber_analyzer = MarketAnalyzer(cyber_market)
-        base_metrics = base_analyzer.calculate_market_metrics()
-        cyber_metrics = cyber_analyzer.calculate_market_metrics()
-        baseline_depth.append(base_metrics['order_depth'])
-        cyber_depth.append(cyber_metrics['order_depth'])
-    t_stat_depth, p_val_depth = ttest_rel(baseline_depth, cyber_depth)
-    results.append({
-        'metric': '市场深度',
-        't_stat': t_stat_depth,
-        'p_val': p_val_depth,
-        'baseline_mean': np.mean(baseline_depth),
-        'cyber_mean': np.mean(cyber_depth)
-    })
-
-    # 2.3 Amihud非流动性指标
-    baseline_amihud = []
-    cyber_amihud = []
-    for base_market, cyber_market in zip(baseline_markets, cyber_markets):
-        base_analyzer = MarketAnalyzer(base_market)
-        cyber_analyzer = MarketAnalyzer(cyber_market)
-        base_metrics = base_analyzer.calculate_market_metrics()
-        cyber_metrics = cyber_analyzer.calculate_market_metrics()
-        baseline_amihud.append(base_metrics['amihud_illiquidity'])
-        cyber_amihud.append(cyber_metrics['amihud_illiquidity'])
-    t_stat_amihud, p_val_amihud = ttest_rel(baseline_amihud, cyber_amihud)
-    results.append({
-        'metric': 'Amihud非流动性',
-        't_stat': t_stat_amihud,
-        'p_val': p_val_amihud,
-        'baseline_mean': np.mean(baseline_amihud),
-        'cyber_mean': np.mean(cyber_amihud)
-    })
-    print("配对t检验：流动性指标分析完成")
-
-    # 3. 价格发现能力分析
-    baseline_deviation = []
-    cyber_deviation = []
-    for base_market, cyber_market in zip(baseline_markets, cyber_markets):
-        base_analyzer = MarketAnalyzer(base_market)
-        cyber_analyzer = MarketAnalyzer(cyber_market)
-        base_metrics = base_analyzer.calculate_market_metrics()
-        cyber_metrics = cyber_analyzer.calculate_market_metrics()
-        baseline_deviation.append(base_metrics['price_deviation'])
-        cyber_deviation.append(cyber_metrics['price_deviation'])
-    t_stat_dev, p_val_dev = ttest_rel(baseline_deviation, cyber_deviation)
-    results.append({
-        'metric': '价格偏离度',
-        't_stat': t_stat_dev,
-        'p_val': p_val_dev,
-        'baseline_mean': np.mean(baseline_deviation),
-        'cyber_mean': np.mean(cyber_deviation)
-    })
-    print("配对t检验：价格发现能力分析完成")
+    # 每个市场只计算一次指标，堆叠为 (实验次数, 指标数) 矩阵，一次完成全部配对t检验
+    baseline_matrix = _metric_matrix(baseline_markets)
+    cyber_matrix = _metric_matrix(cyber_markets)
+    t_stats, p_vals = ttest_rel(baseline_matrix, cyber_matrix, axis=0)
+    baseline_means = baseline_matrix.mean(axis=0)
+    cyber_means = cyber_matrix.mean(axis=0)
+    for j, (metric, _) in enumerate(EFFICIENCY_METRICS):
+        results.append({
+            'metric': metric,
+            't_stat': t_stats[j],
+            'p_val': p_vals[j],
+            'baseline_mean': baseline_means[j],
+            'cyber_mean': cyber_means[j]
+        })
+    print("配对t检验：收益波动率/流动性指标/价格发现能力分析完成")
+
+    baseline_volatility, baseline_spread, baseline_depth, baseline_amihud, baseline_deviation = baseline_matrix.T
+    cyber_volatility, cyber_spread, cyber_depth, cyber_amihud, cyber_deviation = cyber_matrix.T
 
     # 保存t检验结果
     df = pd.DataFrame(results)
@@ -121,55 +59,65 @@ def run_market_efficiency_analysis_multi(baseline_markets, cyber_markets, save_d
     baseline_analyzer = MarketAnalyzer(first_baseline)
     cyber_analyzer = MarketAnalyzer(first_cyber)
 
+    # 三张对比图共用同一个 Figure，每张绘制前清空并调整尺寸；增量模式下已存在的图跳过
+    fig = Figure()
+
     # 1. 收益波动率对比图
-    plt.figure(figsize=(10, 6))
-    plt.boxplot([baseline_volatility, cyber_volatility], labels=['Baseline', 'Cyberbullying'])
-    plt.ylabel('Annualized Volatility')
-    plt.title('收益波动率对比')
-    plt.savefig(os.path.join(save_dir, 'fig4_8_volatility_comparison.png'))
-    plt.close()
+    save_path = os.path.join(save_dir, 'fig4_8_volatility_comparison.png')
+    if not skip_existing_figure(save_path, overwrite):
+        fig.clear()
+        fig.set_size_inches(10, 6)
+        ax = fig.add_subplot()
+        ax.boxplot([baseline_volatility, cyber_volatility], labels=['Baseline', 'Cyberbullying'])
+        ax.set_ylabel('Annualized Volatility')
+        ax.set_title('收益波动率对比')
+        fig.savefig(save_path)
 
     # 2. 流动性指标对比图
-    plt.figure(figsize=(12, 4))
-    plt.subplot(131)
-    plt.boxplot([baseline_spread, cyber_spread], labels=['Baseline', 'Cyberbullying'])
-    plt.ylabel('Bid-Ask Spread')
-    plt.title('买卖价差对比')
-
-    plt.subplot(132)
-    plt.boxplot([baseline_depth, cyber_depth], labels=['Baseline', 'Cyberbullying'])
-    plt.ylabel('Market Depth')
-    plt.title('市场深度对比')
-
-    plt.subplot(133)
-    plt.boxplot([baseline_amihud, cyber_amihud], labels=['Baseline', 'Cyberbullying'])
-    plt.ylabel('Amihud Illiquidity')
-    plt.title('Amihud非流动性对比')
-
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_dir, 'fig4_9_liquidity_metrics_comparison.png'))
-    plt.close()
+    save_path = os.path.join(save_dir, 'fig4_9_liquidity_metrics_comparison.png')
+    if not skip_existing_figure(save_path, overwrite):
+        fig.clear()
+        fig.set_size_inches(12, 4)
+        ax_spread, ax_depth, ax_amihud = fig.subplots(1, 3)
+        ax_spread.boxplot([baseline_spread, cyber_spread], labels=['Baseline', 'Cyberbullying'])
+        ax_spread.set_ylabel('Bid-Ask Spread')
+        ax_spread.set_title('买卖价差对比')
+
+        ax_depth.boxplot([baseline_depth, cyber_depth], labels=['Baseline', 'Cyberbullying'])
+        ax_depth.set_ylabel('Market Depth')
+        ax_depth.set_title('市场深度对比')
+
+        ax_amihud.boxplot([baseline_amihud, cyber_amihud], labels=['Baseline', 'Cyberbullying'])
+        ax_amihud.set_ylabel('Amihud Illiquidity')
+        ax_amihud.set_title('Amihud非流动性对比')
+
+        # 1x3 布局固定，直接给定边距，省去 tight_layout 的迭代求解
+        fig.subplots_adjust(left=0.08, right=0.98, bottom=0.1, top=0.92, wspace=0.4)
+        fig.savefig(save_path)
 
     # 3. 价格发现能力对比图
-    plt.figure(figsize=(10, 6))
-    plt.boxplot([baseline_deviation, cyber_deviation], labels=['Baseline', 'Cyberbullying'])
-    plt.ylabel('Price Deviation')
-    plt.title('价格偏离度对比')
-    plt.savefig(os.path.join(save_dir, 'fig4_10_price_deviation_comparison.png'))
-    plt.close()
+    save_path = os.path.join(save_dir, 'fig4_10_price_deviation_comparison.png')
+    if not skip_existing_figure(save_path, overwrite):
+        fig.clear()
+        fig.set_size_inches(10, 6)
+        ax = fig.add_subplot()
+        ax.boxplot([baseline_deviation, cyber_deviation], labels=['Baseline', 'Cyberbullying'])
+        ax.set_ylabel('Price Deviation')
+        ax.set_title('价格偏离度对比')
+        fig.savefig(save_path)
 
     print(f'4.3多次实验市场效率分析结果已生成，保存在{save_dir}')
 
-def runner_4_3():
+def runner_4_3(overwrite=True):
     """运行4.3节的市场效率分析"""
     # 4.3 多次实验
     baseline_markets = []
     cyber_markets = []
     config = load_config()
-    for seed in range(config['simulation']['n_simulations']):  # 例如20次实验
-        _, _, _, _, baseline_market = run_scenario(False, seed=seed)
-        _, _, _, _, cyber_market = run_scenario(True, seed=seed)
+    seeds = range(config['simulation']['n_simulations'])  # 例如20次实验
+    # 子进程只回传市场对象（run_scenario 返回值的第 5 项）
+    for seed, (baseline_market, cyber_market) in zip(seeds, run_paired_scenarios(seeds, index=4)):
         baseline_markets.append(baseline_market)
         cyber_markets.append(cyber_market)
         print(f"第{seed}次实验完成")
-    run_market_efficiency_analysis_multi(baseline_markets, cyber_markets) 
\ No newline at end of file
+    run_market_efficiency_analysis_multi(baseline_markets, cyber_markets, overwrite=overwrite) 
\ No newline at end of file
@@ -1,68 +1,93 @@
 import os
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import pandas as pd
 from statsmodels.graphics.gofplots import qqplot
 from statsmodels.tsa.stattools import acf
 from scipy.stats import ttest_ind
 from src.analysis.market import MarketAnalyzer
-from src.analysis.experiment_utils import run_scenario
+from src.analysis._kernels import moments
+from src.analysis.experiment_utils import run_scenario, skip_existing_figure
 
-def plot_price_evolution_comparison(baseline_market, cyber_market, save_dir):
-    plt.figure(figsize=(10, 6))
-    plt.plot(baseline_market.price_history, label='Baseline', color='blue')
-    plt.plot(cyber_market.price_history, label='Cyberbullying', color='red', alpha=0.7)
-    plt.title('模拟市场价格时间序列（baseline vs cyberbullying）')
-    plt.xlabel('Time Step')
-    plt.ylabel('Price')
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_dir, 'fig4_1_price_evolution.png'))
-    plt.close()
+def _reset_figure(fig, figsize):
+    """复用传入的 Figure（清空后调整尺寸），未传入时新建，返回 (fig, ax)"""
+    if fig is None:
+        fig = Figure(figsize=figsize)
+    else:
+        fig.clear()
+        fig.set_size_inches(*figsize)
+    return fig, fig.add_subplot()
 
-def plot_return_hist_comparison(baseline_market, cyber_market, save_dir):
-    plt.figure(figsize=(10, 6))
-    returns1 = np.array(baseline_market.log_returns)
-    returns2 = np.array(cyber_market.log_returns)
-    plt.hist(returns1, bins=60, alpha=0.6, label='Baseline', density=True)
-    plt.hist(returns2, bins=60, alpha=0.6, label='Cyberbullying', density=True)
-    plt.title('收益率分布直方图')
-    plt.xlabel('Log Return')
-    plt.ylabel('Density')
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_dir, 'fig4_2_return_hist.png'))
-    plt.close()
+def plot_price_evolution_comparison(baseline_market, cyber_market, save_dir, fig=None, overwrite=True):
+    save_path = os.path.join(save_dir, 'fig4_1_price_evolution.png')
+    if skip_existing_figure(save_path, overwrite):
+        return
+    fig, ax = _reset_figure(fig, (10, 6))
+    ax.plot(baseline_market.price_history, label='Baseline', color='blue')
+    ax.plot(cyber_market.price_history, label='Cyberbullying', color='red', alpha=0.7)
+    ax.set_title('模拟市场价格时间序列（baseline vs cyberbullying）')
+    ax.set_xlabel('Time Step')
+    ax.set_ylabel('Price')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(save_path)
 
-def plot_return_qq_single(market_analyzer, save_path, title):
-    plt.figure(figsize=(6, 6))
-    qqplot(np.array(market_analyzer.log_returns), line='s', ax=plt.gca())
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(save_path)
-    plt.close()
+def plot_return_hist_comparison(baseline_market, cyber_market, save_dir, fig=None, overwrite=True):
+    save_path = os.path.join(save_dir, 'fig4_2_return_hist.png')
+    if skip_existing_figure(save_path, overwrite):
+        return
+    fig, ax = _reset_figure(fig, (10, 6))
+    # MarketAnalyzer 构造时已将收益率转为 float64 数组，直接复用
+    returns1 = baseline_market.log_returns
+    returns2 = cyber_market.log_returns
+    # 两组收益率共用一套分箱边界，直方图用 np.histogram 计算后以柱状图绘制
+    edges = np.histogram_bin_edges(np.concatenate([returns1, returns2]), bins=60)
+    widths = np.diff(edges)
+    density1, _ = np.histogram(returns1, edges, density=True)
+    density2, _ = np.histogram(returns2, edges, density=True)
+    ax.bar(edges[:-1], density1, width=widths, align='edge', alpha=0.6, label='Baseline')
+    ax.bar(edges[:-1], density2, width=widths, align='edge', alpha=0.6, label='Cyberbullying')
+    ax.set_title('收益率分布直方图')
+    ax.set_xlabel('Log Return')
+    ax.set_ylabel('Density')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(save_path)
 
-def plot_return_acf_baseline(baseline_market, save_dir):
-    plt.figure(figsize=(8, 5))
-    acf_vals = acf(np.abs(baseline_market.log_returns), nlags=40)
-    plt.stem(range(len(acf_vals)), acf_vals, use_line_collection=True)
-    plt.title('Baseline 收益率绝对值ACF')
-    plt.xlabel('Lag')
-    plt.ylabel('ACF')
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_dir, 'fig4_4_return_acf_baseline.png'))
-    plt.close()
+def plot_return_qq_single(market_analyzer, save_path, title, fig=None, overwrite=True):
+    if skip_existing_figure(save_path, overwrite):
+        return
+    fig, ax = _reset_figure(fig, (6, 6))
+    qqplot(market_analyzer.log_returns, line='s', ax=ax)
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(save_path)
+
+def plot_return_acf_baseline(baseline_market, save_dir, fig=None, overwrite=True):
+    save_path = os.path.join(save_dir, 'fig4_4_return_acf_baseline.png')
+    if skip_existing_figure(save_path, overwrite):
+        return
+    fig, ax = _reset_figure(fig, (8, 5))
+    # FFT 计算自相关，复杂度 O(N log N)，不随滞后阶数线性增长
+    acf_vals = acf(np.abs(baseline_market.log_returns), nlags=40, fft=True)
+    ax.stem(range(len(acf_vals)), acf_vals, use_line_collection=True)
+    ax.set_title('Baseline 收益率绝对值ACF')
+    ax.set_xlabel('Lag')
+    ax.set_ylabel('ACF')
+    fig.tight_layout()
+    fig.savefig(save_path)
 
 def generate_return_stats_table(baseline_market, cyber_market, save_dir):
     def stats(arr):
-        arr = np.array(arr)
+        # 单次遍历得到均值、标准差、偏度与峰度
+        mean, std, skew, kurt = moments(np.ascontiguousarray(arr, dtype=np.float64))
         return {
-            '均值': np.mean(arr),
-            '标准差': np.std(arr),
-            '偏度': pd.Series(arr).skew(),
-            '峰度': pd.Series(arr).kurtosis(),
+            '均值': mean,
+            '标准差': std,
+            '偏度': skew,
+            '峰度': kurt,
         }
     stats1 = stats(baseline_market.log_returns)
     stats2 = stats(cyber_market.log_returns)
@@ -72,17 +97,22 @@ def generate_return_stats_table(baseline_market, cyber_market, save_dir):
     df.to_csv(os.path.join(save_dir, 'table4_1_return_stats.csv'))
     return df
 
-def run_market_mechanism_analysis(baseline_market, cyber_market, save_dir='thesis/image'):
+def run_market_mechanism_analysis(baseline_market, cyber_market, save_dir='thesis/image', overwrite=True):
+    """overwrite=False 时已存在的图像不再重绘（统计表格照常生成）"""
     os.makedirs(save_dir, exist_ok=True)
-    plot_price_evolution_comparison(baseline_market, cyber_market, save_dir)
-    plot_return_hist_comparison(baseline_market, cyber_market, save_dir)
-    plot_return_qq_single(baseline_market, os.path.join(save_dir, 'fig4_3_return_qq_baseline.png'), 'Baseline 收益率QQ图')
-    plot_return_qq_single(cyber_market, os.path.join(save_dir, 'fig4_3_return_qq_cyberbullying.png'), 'Cyberbullying 收益率QQ图')
-    plot_return_acf_baseline(baseline_market, save_dir)
+    # 各图依次绘制并保存，共用同一个 Figure，避免重复构造
+    fig = Figure()
+    plot_price_evolution_comparison(baseline_market, cyber_market, save_dir, fig=fig, overwrite=overwrite)
+    plot_return_hist_comparison(baseline_market, cyber_market, save_dir, fig=fig, overwrite=overwrite)
+    plot_return_qq_single(baseline_market, os.path.join(save_dir, 'fig4_3_return_qq_baseline.png'), 'Baseline 收益率QQ图',
+                          fig=fig, overwrite=overwrite)
+    plot_return_qq_single(cyber_market, os.path.join(save_dir, 'fig4_3_return_qq_cyberbullying.png'), 'Cyberbullying 收益率QQ图',
+                          fig=fig, overwrite=overwrite)
+    plot_return_acf_baseline(baseline_market, save_dir, fig=fig, overwrite=overwrite)
     generate_return_stats_table(baseline_market, cyber_market, save_dir)
     print(f"4.1市场机制验证图表已生成，保存在{save_dir}") 
 
-def runner_4_1():
+def runner_4_1(overwrite=True):
     # baseline
     _, _, _, _, baseline_market = run_scenario(False, seed=0)
     # cyberbullying
@@ -92,4 +122,4 @@ def runner_4_1():
     baseline_analyzer = MarketAnalyzer(baseline_market)
     cyber_analyzer = MarketAnalyzer(cyber_market)
     
-    run_market_mechanism_analysis(baseline_analyzer, cyber_analyzer)
\ No newline at end of file
+    run_market_mechanism_analysis(baseline_analyzer, cyber_analyzer, overwrite=overwrite)
\ No newline at end of file
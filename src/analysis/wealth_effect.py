@@ -1,157 +1,177 @@
 import os
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import pandas as pd
 from scipy.stats import ttest_rel
-from src.analysis.experiment_utils import run_scenario
+from src.analysis.experiment_utils import run_paired_scenarios, skip_existing_figure
 from src.config.loader import load_config
+from src.analysis._kernels import sorted_mean_gini
+from src.traders.base import BaseTrader, TRADER_TYPE_CODES
 def get_final_wealth(agent):
     return agent.cash + agent.stock * agent.config['fundamental_price']
 
+def final_wealth_vector(agents):
+    """
+    一次性取出全部交易者的现金、持仓与基本面价格（结构数组化），
+    以向量运算得到终期财富，顺序与 agents 一致
+    """
+    n = len(agents)
+    cash = np.fromiter((a.cash for a in agents), dtype=np.float64, count=n)
+    stock = np.fromiter((a.stock for a in agents), dtype=np.float64, count=n)
+    price = np.fromiter((a.config['fundamental_price'] for a in agents), dtype=np.float64, count=n)
+    return cash + stock * price
+
+def _type_codes(agents):
+    """交易者类型编码数组（int8），用于构造按类型划分的布尔掩码"""
+    return np.fromiter((a.type_code for a in agents), dtype=np.int8, count=len(agents))
+
 def get_group_wealth(agents, group):
-    return [get_final_wealth(a) for a in agents if a.type == group]
+    return final_wealth_vector(agents)[_type_codes(agents) == TRADER_TYPE_CODES.get(group, -1)]
+
+def split_group_wealth(agents):
+    """按群体划分终期财富（散户/机构/被攻击散户/未被攻击散户），各组为 float64 数组"""
+    wealth = final_wealth_vector(agents)
+    type_codes = _type_codes(agents)
+    bullied = np.fromiter((a.is_bullied for a in agents), dtype=bool, count=len(agents))
+    retail = type_codes == BaseTrader.RETAIL
+    return {
+        'retail': wealth[retail],
+        'institutional': wealth[type_codes == BaseTrader.INSTITUTIONAL],
+        'attacked': wealth[retail & bullied],
+        'not_attacked': wealth[retail & ~bullied],
+    }
 
 def gini_coefficient(wealths):
-    wealths = np.sort(wealths)
-    n = len(wealths)
-    index = np.arange(1, n + 1)
-    return ((2 * index - n - 1) * wealths).sum() / (n * wealths.sum())
+    return sorted_mean_gini(np.sort(np.asarray(wealths, dtype=np.float64)))[1]
+
+WEALTH_METRIC_NAMES = ['散户均值', '机构均值', '被攻击散户均值', '未被攻击散户均值', '散户基尼系数']
 
-def run_wealth_effect_analysis_multi(baseline_agents_runs, cyber_agents_runs, save_dir='thesis/image'):
+def _wealth_metrics(groups, attacked_group):
+    """单次实验的财富指标，顺序与 WEALTH_METRIC_NAMES 一致"""
+    # 散户均值与基尼系数在排序后的同一次遍历中得到
+    retail_mean, retail_gini = sorted_mean_gini(np.sort(groups['retail']))
+    return [
+        retail_mean,
+        np.mean(groups['institutional']),
+        np.mean(groups[attacked_group]),
+        np.mean(groups['not_attacked']),
+        retail_gini,
+    ]
+
+def _wealth_matrix(groups_runs, attacked_group):
+    """逐次实验写入预分配的 (实验次数, 指标数) 矩阵，列顺序同 WEALTH_METRIC_NAMES"""
+    matrix = np.empty((len(groups_runs), len(WEALTH_METRIC_NAMES)))
+    for i, groups in enumerate(groups_runs):
+        matrix[i] = _wealth_metrics(groups, attacked_group)
+    return matrix
+
+def run_wealth_effect_analysis_multi(baseline_agents_runs, cyber_agents_runs, save_dir='thesis/image', overwrite=True):
+    # 每次实验的群体划分只计算一次，供各项检验与绘图复用
+    baseline_groups = [split_group_wealth(agents) for agents in baseline_agents_runs]
+    cyber_groups = [split_group_wealth(agents) for agents in cyber_agents_runs]
+    run_wealth_effect_analysis_groups(baseline_groups, cyber_groups, save_dir, overwrite=overwrite)
+
+def run_wealth_effect_analysis_groups(baseline_groups, cyber_groups, save_dir='thesis/image', overwrite=True):
+    """
+    基于 split_group_wealth 的分组结果完成配对t检验与绘图
+    （overwrite=False 时已存在的图像不再重绘，检验结果照常保存）
+    """
     os.makedirs(save_dir, exist_ok=True)
     results = []
 
-    # 1. 网暴对散户财富影响是否显著
-    retail_baseline = []
-    retail_cyber = []
-    for base_agents, cyber_agents in zip(baseline_agents_runs, cyber_agents_runs):
-        retail_baseline.append(np.mean([get_final_wealth(a) for a in base_agents if a.type == 'retail']))
-        retail_cyber.append(np.mean([get_final_wealth(a) for a in cyber_agents if a.type == 'retail']))
-    t_stat_retail, p_val_retail = ttest_rel(retail_baseline, retail_cyber)
-    results.append({
-        'group': '散户均值', 
-        't_stat': t_stat_retail, 
-        'p_val': p_val_retail,
-        'baseline_mean': np.mean(retail_baseline),
-        'cyber_mean': np.mean(retail_cyber)
-    })
-    print("配对t检验：散户财富影响分析完成")
-
-    # 2. 网暴对机构财富影响是否显著
-    inst_baseline = []
-    inst_cyber = []
-    for base_agents, cyber_agents in zip(baseline_agents_runs, cyber_agents_runs):
-        inst_baseline.append(np.mean([get_final_wealth(a) for a in base_agents if a.type == 'institutional']))
-        inst_cyber.append(np.mean([get_final_wealth(a) for a in cyber_agents if a.type == 'institutional']))
-    t_stat_inst, p_val_inst = ttest_rel(inst_baseline, inst_cyber)
-    results.append({
-        'group': '机构均值', 
-        't_stat': t_stat_inst, 
-        'p_val': p_val_inst,
-        'baseline_mean': np.mean(inst_baseline),
-        'cyber_mean': np.mean(inst_cyber)
-    })
-    print("配对t检验：机构财富影响分析完成")
-
-    # 3. 被攻击/未被攻击散户
-    attacked_baseline, attacked_cyber = [], []
-    not_attacked_baseline, not_attacked_cyber = [], []
-    for base_agents, cyber_agents in zip(baseline_agents_runs, cyber_agents_runs):
-        attacked_cyber.append(np.mean([get_final_wealth(a) for a in cyber_agents if a.type == 'retail' and getattr(a, 'is_bullied', False)]))
-        not_attacked_baseline.append(np.mean([get_final_wealth(a) for a in base_agents if a.type == 'retail' and not getattr(a, 'is_bullied', False)]))
-        not_attacked_cyber.append(np.mean([get_final_wealth(a) for a in cyber_agents if a.type == 'retail' and not getattr(a, 'is_bullied', False)]))
-    t_stat_attacked, p_val_attacked = ttest_rel(not_attacked_baseline, attacked_cyber)
-    t_stat_not_attacked, p_val_not_attacked = ttest_rel(not_attacked_baseline, not_attacked_cyber)
-    results.append({
-        'group': '被攻击散户均值', 
-        't_stat': t_stat_attacked, 
-        'p_val': p_val_attacked,
-        'baseline_mean': np.mean(attacked_baseline),
-        'cyber_mean': np.mean(attacked_cyber)
-    })
-    results.append({
-        'group': '未被攻击散户均值', 
-        't_stat': t_stat_not_attacked, 
-        'p_val': p_val_not_attacked,
-        'baseline_mean': np.mean(not_attacked_baseline),
-        'cyber_mean': np.mean(not_attacked_cyber)
-    })
-    print("配对t检验：被攻击/未被攻击散户财富影响分析完成")
-
-    # 4. 散户基尼系数
-    gini_baseline, gini_cyber = [], []
-    for base_agents, cyber_agents in zip(baseline_agents_runs, cyber_agents_runs):
-        gini_baseline.append(gini_coefficient([get_final_wealth(a) for a in base_agents if a.type == 'retail']))
-        gini_cyber.append(gini_coefficient([get_final_wealth(a) for a in cyber_agents if a.type == 'retail']))
-    t_stat_gini, p_val_gini = ttest_rel(gini_baseline, gini_cyber)
-    results.append({
-        'group': '散户基尼系数', 
-        't_stat': t_stat_gini, 
-        'p_val': p_val_gini,
-        'baseline_mean': np.mean(gini_baseline),
-        'cyber_mean': np.mean(gini_cyber)
-    })
-    print("配对t检验：散户基尼系数分析完成")
+    # 各项指标按实验堆叠为 (实验次数, 指标数) 矩阵，一次完成全部配对t检验
+    # baseline 中不存在被攻击散户，以未被攻击散户作为对照组
+    baseline_matrix = _wealth_matrix(baseline_groups, 'not_attacked')
+    cyber_matrix = _wealth_matrix(cyber_groups, 'attacked')
+    t_stats, p_vals = ttest_rel(baseline_matrix, cyber_matrix, axis=0)
+    baseline_means = baseline_matrix.mean(axis=0)
+    cyber_means = cyber_matrix.mean(axis=0)
+    for j, group in enumerate(WEALTH_METRIC_NAMES):
+        results.append({
+            'group': group,
+            't_stat': t_stats[j],
+            'p_val': p_vals[j],
+            'baseline_mean': baseline_means[j],
+            'cyber_mean': cyber_means[j]
+        })
+    print("配对t检验：散户/机构/被攻击与未被攻击散户/基尼系数财富影响分析完成")
+    gini_baseline, gini_cyber = baseline_matrix[:, -1], cyber_matrix[:, -1]
 
     # 保存t检验结果
     df = pd.DataFrame(results)
     df.to_csv(os.path.join(save_dir, 'table4_2_wealth_ttest_results.csv'), index=False)
 
     # 使用最后一次实验的结果生成可视化图表
-    first_baseline = baseline_agents_runs[0]
-    first_cyber = cyber_agents_runs[0]
+    first_baseline = baseline_groups[0]
+    first_cyber = cyber_groups[0]
+
+    # 四张对比图共用同一个 Figure，每张绘制前清空并调整尺寸；增量模式下已存在的图跳过
+    fig = Figure()
 
     # 1. 散户财富分布对比图
-    plt.figure(figsize=(10, 6))
-    retail_baseline_wealth = [get_final_wealth(a) for a in first_baseline if a.type == 'retail']
-    retail_cyber_wealth = [get_final_wealth(a) for a in first_cyber if a.type == 'retail']
-    plt.boxplot([retail_baseline_wealth, retail_cyber_wealth], labels=['Baseline-散户', 'Cyber-散户'])
-    plt.ylabel('Final Wealth')
-    plt.title('散户终期财富分布对比')
-    plt.savefig(os.path.join(save_dir, 'fig4_5_final_wealth_boxplot_retail.png'))
-    plt.close()
+    save_path = os.path.join(save_dir, 'fig4_5_final_wealth_boxplot_retail.png')
+    if not skip_existing_figure(save_path, overwrite):
+        fig.clear()
+        fig.set_size_inches(10, 6)
+        ax = fig.add_subplot()
+        retail_baseline_wealth = first_baseline['retail']
+        retail_cyber_wealth = first_cyber['retail']
+        ax.boxplot([retail_baseline_wealth, retail_cyber_wealth], labels=['Baseline-散户', 'Cyber-散户'])
+        ax.set_ylabel('Final Wealth')
+        ax.set_title('散户终期财富分布对比')
+        fig.savefig(save_path)
 
     # 2. 机构财富分布对比图
-    plt.figure(figsize=(10, 6))
-    inst_baseline_wealth = [get_final_wealth(a) for a in first_baseline if a.type == 'institutional']
-    inst_cyber_wealth = [get_final_wealth(a) for a in first_cyber if a.type == 'institutional']
-    plt.boxplot([inst_baseline_wealth, inst_cyber_wealth], labels=['Baseline-机构', 'Cyber-机构'])
-    plt.ylabel('Final Wealth')
-    plt.title('机构终期财富分布对比')
-    plt.savefig(os.path.join(save_dir, 'fig4_5_final_wealth_boxplot_institutional.png'))
-    plt.close()
+    save_path = os.path.join(save_dir, 'fig4_5_final_wealth_boxplot_institutional.png')
+    if not skip_existing_figure(save_path, overwrite):
+        fig.clear()
+        fig.set_size_inches(10, 6)
+        ax = fig.add_subplot()
+        inst_baseline_wealth = first_baseline['institutional']
+        inst_cyber_wealth = first_cyber['institutional']
+        ax.boxplot([inst_baseline_wealth, inst_cyber_wealth], labels=['Baseline-机构', 'Cyber-机构'])
+        ax.set_ylabel('Final Wealth')
+        ax.set_title('机构终期财富分布对比')
+        fig.savefig(save_path)
 
     # 3. 被攻击/未被攻击散户财富分布对比图
-    plt.figure(figsize=(10, 6))
-    baseline_retail = [get_final_wealth(a) for a in first_baseline if a.type == 'retail']
-    attacked_cyber = [get_final_wealth(a) for a in first_cyber if a.type == 'retail' and getattr(a, 'is_bullied', False)]
-    not_attacked_cyber = [get_final_wealth(a) for a in first_cyber if a.type == 'retail' and not getattr(a, 'is_bullied', False)]
-    plt.boxplot([baseline_retail, attacked_cyber, not_attacked_cyber],
-                labels=['Baseline-散户', 'Cyber-被攻击散户', 'Cyber-未被攻击散户'])
-    plt.ylabel('Final Wealth')
-    plt.title('散户财富分布对比（Baseline vs Cyber-被攻击/未被攻击）')
-    plt.savefig(os.path.join(save_dir, 'fig4_6_attacked_vs_not_boxplot.png'))
-    plt.close()
+    save_path = os.path.join(save_dir, 'fig4_6_attacked_vs_not_boxplot.png')
+    if not skip_existing_figure(save_path, overwrite):
+        fig.clear()
+        fig.set_size_inches(10, 6)
+        ax = fig.add_subplot()
+        baseline_retail = first_baseline['retail']
+        attacked_cyber = first_cyber['attacked']
+        not_attacked_cyber = first_cyber['not_attacked']
+        ax.boxplot([baseline_retail, attacked_cyber, not_attacked_cyber],
+                   labels=['Baseline-散户', 'Cyber-被攻击散户', 'Cyber-未被攻击散户'])
+        ax.set_ylabel('Final Wealth')
+        ax.set_title('散户财富分布对比（Baseline vs Cyber-被攻击/未被攻击）')
+        fig.savefig(save_path)
 
     # 4. 基尼系数对比图
-    plt.figure(figsize=(8, 6))
-    plt.boxplot([gini_baseline, gini_cyber], labels=['Baseline', 'Cyberbullying'])
-    plt.ylabel('Gini Coefficient')
-    plt.title('散户内部不平等性（基尼系数）多次实验分布')
-    plt.savefig(os.path.join(save_dir, 'fig4_7_gini_comparison_boxplot.png'))
-    plt.close()
+    save_path = os.path.join(save_dir, 'fig4_7_gini_comparison_boxplot.png')
+    if not skip_existing_figure(save_path, overwrite):
+        fig.clear()
+        fig.set_size_inches(8, 6)
+        ax = fig.add_subplot()
+        ax.boxplot([gini_baseline, gini_cyber], labels=['Baseline', 'Cyberbullying'])
+        ax.set_ylabel('Gini Coefficient')
+        ax.set_title('散户内部不平等性（基尼系数）多次实验分布')
+        fig.savefig(save_path)
 
     print(f'4.2多次实验财富影响分析结果已生成，保存在{save_dir}')
 
-def runner_4_2():
+def runner_4_2(overwrite=True):
     # 4.2 多次实验
-    baseline_agents_runs = []
-    cyber_agents_runs = []
+    baseline_groups = []
+    cyber_groups = []
     config = load_config()
-    for seed in range(config['simulation']['n_simulations']):  # 例如20次实验
-        baseline_agents0, baseline_agents1, _, _, _ = run_scenario(False, seed=seed)
-        cyber_agents0, cyber_agents1, _, _, _ = run_scenario(True, seed=seed)
-        baseline_agents_runs.append(baseline_agents1)
-        cyber_agents_runs.append(cyber_agents1)
+    seeds = range(config['simulation']['n_simulations'])  # 例如20次实验
+    # 子进程内完成群体财富划分，只回传各组财富数组而非整个交易者对象图
+    runs = run_paired_scenarios(seeds, index=1, reducer=split_group_wealth)
+    for seed, (baseline, cyber) in zip(seeds, runs):
+        baseline_groups.append(baseline)
+        cyber_groups.append(cyber)
         print(f"第{seed}次实验完成")
-    run_wealth_effect_analysis_multi(baseline_agents_runs, cyber_agents_runs)
\ No newline at end of file
+    run_wealth_effect_analysis_groups(baseline_groups, cyber_groups, overwrite=overwrite)
\ No newline at end of file
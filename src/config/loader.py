@@ -1,9 +1,18 @@
 import yaml
 import os
+import copy
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def _read_config(config_path):
+    """解析 YAML 文件，结果按路径缓存，同一进程内只解析一次"""
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f)
 
 def load_config(filename="config.yaml"):
     """
     从 src/config/ 目录中加载 YAML 配置文件。
+    返回缓存结果的深拷贝，调用方（如 run_scenario）可以放心修改。
     """
     # 获取当前文件所在目录（即 src/config）
     base_dir = os.path.dirname(__file__)
@@ -12,7 +21,4 @@ def load_config(filename="config.yaml"):
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"配置文件未找到: {config_path}")
 
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
-
-    return config
\ No newline at end of file
+    return copy.deepcopy(_read_config(config_path))
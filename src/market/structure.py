@@ -1,23 +1,46 @@
 from src.order.orders import Order
 from src.order.orderbooks import OrderBook
 from src.social.cyberbullying import CyberbullyingModel
+import logging
 import random
 import numpy as np
 from typing import Optional, Dict
+
+# 调试输出走 logging，默认级别下不输出；需要逐步跟踪时将本 logger 设为 DEBUG
+logger = logging.getLogger(__name__)
+
+# 交易者数不超过该值时整体置换后取前 n 个下标，比 Generator.choice 无放回抽样的固定开销小；
+# 更大规模时置换本身的代价超过 choice
+_PERMUTATION_MAX_AGENTS = 500
+
 class Market:
-    def __init__(self, orderbook: OrderBook, max_timesteps: int, config: dict, cyberbullying_model: Optional[CyberbullyingModel] = None):
+    def __init__(self, orderbook: OrderBook, max_timesteps: int, config: dict, cyberbullying_model: Optional[CyberbullyingModel] = None,
+                 seed: Optional[int] = None):
         self.orderbook = orderbook
         self.max_timesteps = max_timesteps
         self.config = config
         self.current_time = 0
         self.agents = []  # 交易者列表
+        self._agent_array = None  # agents 的对象数组，按下标批量抽取激活交易者，注册新交易者时失效
+        self._agents_by_id = {}  # trader_id -> 交易者，成交结算时按编号查找
 
         self.price_history = []
         self.log_returns = []
+        self._log_return_sums = [0.0]  # 对数收益率前缀和，交易者 O(1) 取最近 tau 期均值
         self.fundamental_price = config["market"].get("fundamental_price", 300.0)
         self.fundamental_price_history = [self.fundamental_price]  # 记录基础价格历史
         self.sigma_f = config["market"].get("fundamental_volatility", 0.001)
+        # 基础价格冲击使用本市场独立的随机数流，一次性抽取全部时间步并换算为乘数
+        self._rng = np.random.default_rng(seed)
+        mu = config["market"].get("fundamental_drift", 0.0001)
+        self._fundamental_drift = mu - 0.5 * self.sigma_f ** 2
+        self._fundamental_multipliers = np.exp(
+            self._fundamental_drift + self.sigma_f * self._rng.standard_normal(max_timesteps))
+        # 撮合模式与激活比例在一次模拟内不变，构造时读取一次
+        self._mode = config["market"]["mode"]
+        self._activation_ratio = config["market"].get("activation_ratio", 0.1)
         self.cyberbullying_model = cyberbullying_model
+        self._debug = False  # 每步开始时按 logger 级别刷新，热路径只读这个布尔值
         self.enable_cyberbullying = config.get("social", {}).get("enable_cyberbullying", False)
 
         # 流动性指标历史
@@ -28,6 +51,9 @@ class Market:
     def register_agent(self, agent):
         """注册交易者"""
         self.agents.append(agent)
+        self._agent_array = None
+        # 编号重复时保留先注册者，与按列表顺序查找的结果一致
+        self._agents_by_id.setdefault(agent.trader_id, agent)
 
     def _update_liquidity_metrics(self):
         """更新流动性指标"""
@@ -62,17 +88,19 @@ class Market:
     def step(self):
         self.orderbook.current_timestep = self.current_time
         self.orderbook.cancel_timed_out_orders(self.current_time)
-        # print(f"\n--- Time Step {self.current_time} ---")
-        # print(f"📊 Market Snapshot:")
-        # print(f"  - Best Bid: {self.orderbook.best_bid()}")
-        # print(f"  - Best Ask: {self.orderbook.best_ask()}")
-        # print(f"  - Last Price: {self.price_history[-1] if self.price_history else 'N/A'}")
-        # print(f"  - Fundamental: {self.fundamental_price:.2f}")
-
-        Z = np.random.normal(0, 1)
+        self._debug = logger.isEnabledFor(logging.DEBUG)
+        if self._debug:
+            logger.debug("--- Time Step %d --- best_bid=%s best_ask=%s last_price=%s fundamental=%.2f",
+                         self.current_time, self.orderbook.best_bid(), self.orderbook.best_ask(),
+                         self.price_history[-1] if self.price_history else 'N/A', self.fundamental_price)
+
         # 股票基础价格遵循带正漂移项的几何布朗运动
-        mu = self.config["market"].get("fundamental_drift", 0.0001)
-        self.fundamental_price *= np.exp((mu - 0.5 * self.sigma_f ** 2) + self.sigma_f * Z)
+        if self.current_time < self._fundamental_multipliers.shape[0]:
+            multiplier = self._fundamental_multipliers[self.current_time]
+        else:
+            # 超出预抽取范围（run 之外继续调用 step）时逐步抽取
+            multiplier = np.exp(self._fundamental_drift + self.sigma_f * self._rng.standard_normal())
+        self.fundamental_price *= multiplier
         self.fundamental_price_history.append(self.fundamental_price)  # 记录新的基础价格
 
         if self.enable_cyberbullying and self.cyberbullying_model:
@@ -81,72 +109,82 @@ class Market:
         if not self.agents:
             return
 
-        mode = self.config["market"]["mode"]
+        mode = self._mode
         if mode == "single_agent_per_step":
             agent = random.choice(self.agents)
             market_snapshot = self._build_market_snapshot()
             self._process_agent(agent, market_snapshot)
 
         elif mode == "partial_agents_per_step":
-            ratio = self.config["market"].get("activation_ratio", 0.1)
-            n = max(1, int(len(self.agents) * ratio))
-            selected = random.sample(self.agents, n)
-            for agent in selected:
-                market_snapshot = self._build_market_snapshot()
-                self._process_agent(agent, market_snapshot)
+            n = max(1, int(len(self.agents) * self._activation_ratio))
+            if self._agent_array is None:
+                self._agent_array = np.empty(len(self.agents), dtype=object)
+                for i, registered in enumerate(self.agents):
+                    self._agent_array[i] = registered
+            # 无放回抽取 n 个下标，由本市场的随机数流生成
+            n_agents = len(self._agent_array)
+            if n_agents <= _PERMUTATION_MAX_AGENTS:
+                idx = self._rng.permutation(n_agents)[:n]
+            else:
+                idx = self._rng.choice(n_agents, size=n, replace=False)
+            self._process_agents(self._agent_array[idx])
 
         elif mode == "all_agents_per_step":
-            for agent in self.agents:
-                market_snapshot = self._build_market_snapshot()
-                self._process_agent(agent, market_snapshot)
+            self._process_agents(self.agents)
 
         self._update_liquidity_metrics()
         self.current_time += 1
         self._update_price_history()
 
-    def _process_agent(self, agent, market_snapshot):
+    def _process_agents(self, agents):
+        """
+        依次处理多个交易者。快照只在有订单提交后重建：
+        步内价格历史与基础价格不变，只有新订单会改变最优买卖价
+        """
         market_snapshot = self._build_market_snapshot()
-        # print(f"\n🧠 Trader {agent.trader_id} deciding to trade...")
+        for agent in agents:
+            if self._process_agent(agent, market_snapshot):
+                market_snapshot = self._build_market_snapshot()
 
+    def _process_agent(self, agent, market_snapshot) -> bool:
+        """处理单个交易者的决策，返回是否提交了订单"""
         order = agent.generate_order(self.current_time, market_snapshot)
         if order:
-            # print(f"✅ Trader {agent.trader_id} submits order: {order}")
-            # 记录当前成交日志长度
-            trade_log_length_before = len(self.orderbook.trade_log)
-            # 提交订单
-            self.orderbook.submit_order(order)
-            # 检查是否有新的成交
-            if len(self.orderbook.trade_log) > trade_log_length_before:
-                # 只处理新产生的成交
-                new_trades = self.orderbook.trade_log[trade_log_length_before:]
+            if self._debug:
+                logger.debug("Trader %s submits order: %s", agent.trader_id, order)
+            # 提交订单，返回值即本次新产生的成交（成交日志末尾的视图，不复制）
+            new_trades = self.orderbook.submit_order(order)
+            if len(new_trades):
                 self._process_trades(new_trades)
-        else:
-            pass
+            return True
+        return False
 
     def _process_trades(self, trades):
         """处理成交信息并更新交易者资产"""
-        for trade in trades:
-            buyer = next((t for t in self.agents if t.trader_id == trade['buyer_id']), None)
-            seller = next((t for t in self.agents if t.trader_id == trade['seller_id']), None)
+        # tolist() 将结构化记录一次性转为 Python 标量元组，避免逐字段访问 NumPy 标量
+        for buyer_id, seller_id, _, trade_price, trade_qty in trades.tolist():
+            buyer = self._agents_by_id.get(buyer_id)
+            seller = self._agents_by_id.get(seller_id)
             
             if buyer and seller:
                 # 更新买家资产
-                buyer.cash -= trade['trade_qty'] * trade['trade_price']
-                buyer.stock += trade['trade_qty']
+                buyer.cash -= trade_qty * trade_price
+                buyer.stock += trade_qty
                 # 强制非负
                 buyer.cash = max(buyer.cash, 0)
                 buyer.stock = max(buyer.stock, 0)
                 
                 # 更新卖家资产
-                seller.cash += trade['trade_qty'] * trade['trade_price']
-                seller.stock -= trade['trade_qty']
+                seller.cash += trade_qty * trade_price
+                seller.stock -= trade_qty
                 # 强制非负
                 seller.cash = max(seller.cash, 0)
                 seller.stock = max(seller.stock, 0)
-                
-                # print(f"💰 Asset update after trade:")
-                # print(f"  - Buyer {buyer.trader_id}: cash={buyer.cash:.2f}, stock={buyer.stock:.2f}")
-                # print(f"  - Seller {seller.trader_id}: cash={seller.cash:.2f}, stock={seller.stock:.2f}")
+
+                if self._debug:
+                    logger.debug("Asset update after trade: buyer %s cash=%.2f stock=%s, seller %s cash=%.2f stock=%s",
+                                 buyer.trader_id, buyer.cash, buyer.stock,
+                                 seller.trader_id, seller.cash, seller.stock)
 
     def run(self):
         for _ in range(self.max_timesteps):
@@ -164,17 +202,19 @@ class Market:
             "last_price": last_price,
             "fundamental_price": self.fundamental_price,
             "log_returns": self.log_returns,
+            "log_return_sums": self._log_return_sums,
             "best_ask": self.orderbook.best_ask(),
             "best_bid": self.orderbook.best_bid()
         }
 
     def _update_price_history(self):
         if self.orderbook.trade_log:
-            last_price = self.orderbook.trade_log[-1]['trade_price']
+            last_price = float(self.orderbook.trade_log[-1]['trade_price'])
             self.price_history.append(last_price)
             if len(self.price_history) >= 2:
                 r_t = np.log(self.price_history[-1] / self.price_history[-2])
                 self.log_returns.append(r_t)
+                self._log_return_sums.append(self._log_return_sums[-1] + float(r_t))
 
     def __repr__(self):
         return (f"<Market | timestep={self.current_time}/{self.max_timesteps} | "
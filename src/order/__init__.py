@@ -1,9 +1,11 @@
 from .orders import Order, OrderDirection, OrderType
 from .orderbooks import OrderBook
+from .trades import TradeLog
 
 __all__ = [
     'Order',
     'OrderDirection',
     'OrderType',
-    'OrderBook'
+    'OrderBook',
+    'TradeLog'
 ] 
\ No newline at end of file
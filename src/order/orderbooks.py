@@ -1,148 +1,229 @@
 import heapq
-from typing import List, Optional, Tuple, Dict
+import itertools
+import math
+import operator
+from collections import deque
+import numpy as np
+from typing import Optional, Dict
+from sortedcontainers import SortedDict
 from .orders import Order, OrderType, OrderDirection, OrderStatus
+from .trades import TradeLog
+
+# 最优价缓存失效标记（None 表示该侧无挂单，不能用作失效标记）
+_STALE = object()
+
+
+class PriceLevel:
+    """同一价格档位上的挂单队列，按到达顺序（FIFO）保证时间优先"""
+    __slots__ = ('price', 'orders')
+
+    def __init__(self, price: float):
+        self.price = price
+        self.orders = deque()
 
 
 class OrderBook:
     def __init__(self):
-        self.buys: List[Tuple[float, int, Order]] = []
-        self.sells: List[Tuple[float, int, Order]] = []
-        self.trade_log = []
+        # 价格 -> 档位的有序字典，首项即最优档位：买盘按价格从高到低，卖盘按价格从低到高
+        self.buys: SortedDict = SortedDict(operator.neg)
+        self.sells: SortedDict = SortedDict()
+        self.trade_log = TradeLog()
+        # 按到期时间步登记挂单：到期步 -> 订单列表，另以最小堆记录待处理的到期步
+        self._expiry: Dict[int, list] = {}
+        self._expiry_steps = []
+        # 最优买卖价缓存，订单簿发生变化时置为 _STALE
+        self._best_bid = _STALE
+        self._best_ask = _STALE
         self.agents = []
         self.current_timestep = 0
+        # 订单类型 -> 处理方法，submit_order 一次查表分派
+        self._handlers = {
+            OrderType.MARKET: self._match_market_order,
+            OrderType.LIMIT: self._submit_limit_order,
+        }
 
     def set_agents(self, agents):
         """设置代理列表"""
         self.agents = agents
         
-    def submit_order(self, order: Order):
+    def submit_order(self, order: Order) -> np.ndarray:
+        """提交订单，返回本次撮合产生的成交记录（trade_log 末尾的结构化数组切片）"""
         # print(f"📥 OrderBook received: {order}")
-        if order.order_type == OrderType.MARKET:
-            self._match_market_order(order)
-        elif order.order_type == OrderType.LIMIT:
-            self._submit_limit_order(order)
-
-    def _submit_limit_order(self, order: Order):
-        entry = (self._priority(order), order.order_id, order)
-        if order.direction == OrderDirection.BUY:
-            heapq.heappush(self.buys, entry)
-        else:
-            heapq.heappush(self.sells, entry)
+        handler = self._handlers.get(order.order_type)
+        if handler is None:
+            return self.trade_log[len(self.trade_log):]
+        return handler(order)
 
-    def _match_market_order(self, order: Order):
-        book = self.sells if order.direction == OrderDirection.BUY else self.buys
-        remaining_quantity = order.quantity  # 剩余的市价单数量
+    def _submit_limit_order(self, order: Order) -> np.ndarray:
+        # 可成交的限价单先与对手方撮合，剩余部分再挂单，避免买卖盘交叉
+        trades = self._match(order)
+        if order.quantity > 0:
+            self._rest_order(order)
+        # 撮合与挂单都会改变最优价，完成后再使缓存失效
+        self._invalidate_best()
+        return trades
 
-        # 获取当前市场最优价格
-        if order.direction == OrderDirection.BUY:
-            trade_price = self.best_ask()  # 买单需要匹配卖单的最优价格
-        elif order.direction == OrderDirection.SELL:
-            trade_price = self.best_bid()  # 卖单需要匹配买单的最优价格
+    def _rest_order(self, order: Order):
+        if order.price is None:
+            raise ValueError("Limit orders must have price")
+        book = self.buys if order.direction == OrderDirection.BUY else self.sells
+        level = book.get(order.price)
+        if level is None:
+            level = PriceLevel(order.price)
+            book[order.price] = level
+        level.orders.append(order)
+        # 满足 current - timestep > max_wait_time 的最小整数时间步
+        expiry = math.floor(order.timestep + order.max_wait_time) + 1
+        bucket = self._expiry.get(expiry)
+        if bucket is None:
+            self._expiry[expiry] = [order]
+            heapq.heappush(self._expiry_steps, expiry)
+        else:
+            bucket.append(order)
 
-        if trade_price is None:
+    def _match_market_order(self, order: Order) -> np.ndarray:
+        # 对手方没有报价时市价单直接作废，不进入订单簿
+        opposite_best = self.best_ask() if order.direction == OrderDirection.BUY else self.best_bid()
+        if opposite_best is None:
             # print("No matching market price found, cannot execute the order")
-            return
-        
-        _, _, top_order = book[0]
-        # 遍历订单簿，成交所有符合条件的订单
-        while remaining_quantity > 0 and book:
-            _, _, top_order = heapq.heappop(book)
-
-            # 只有当 top_order 的价格符合当前市价单的价格时才成交
-            if (order.direction == OrderDirection.BUY and top_order.price <= order.price) or \
-            (order.direction == OrderDirection.SELL and top_order.price >= order.price):
-                trade_qty = min(remaining_quantity, top_order.quantity)
-                trade_price = top_order.price if top_order.price else 0.0
-
-                # 执行成交
-                order.execute(trade_price, order.timestep, trade_qty)
-                top_order.execute(trade_price, order.timestep, trade_qty)
-
-                # 记录成交信息
-                trade_info = {
-                    'buyer_id': order.trader_id if order.direction == OrderDirection.BUY else top_order.trader_id,
-                    'seller_id': top_order.trader_id if order.direction == OrderDirection.BUY else order.trader_id,
-                    'trade_timestamp': order.timestep,
-                    'trade_price': trade_price,
-                    'trade_qty': trade_qty
-                }
-                self.trade_log.append(trade_info)
-                # print(f"💥 TRADE: {order.order_id} <-> {top_order.order_id} at price={trade_price} qty={trade_qty}")
-                remaining_quantity -= trade_qty
-
-                # 如果卖单部分成交，说明order成交完全,剩余部分继续在订单簿中
-                if top_order.quantity > 0:
-                    heapq.heappush(book, (self._priority(top_order), top_order.order_id, top_order))
-            else:
-                break
-        
-        # 只有当市价单仍有剩余量时，才将剩余部分转为限价单
-        if remaining_quantity > 0:
-            limit_order = Order(
-                trader_id=order.trader_id,
-                order_type=OrderType.LIMIT,
-                direction=order.direction,
-                quantity=remaining_quantity,
-                timestep=order.timestep,
-                price=order.price,
-                max_wait_time=order.max_wait_time
-            )
-            self.submit_order(limit_order)
-            # print(f"Remaining part of the market order converted to limit order at price {order.price}")
-
-    def _priority(self, order: Order) -> float:
+            return self.trade_log[len(self.trade_log):]
+
         if order.price is None:
-            raise ValueError("Limit orders must have price")
-        return -order.price if order.direction == OrderDirection.BUY else order.price
+            # 不带价格的市价单按对手方档位依次成交，剩余部分无法挂单，直接撤销
+            trades = self._match(order)
+            if order.quantity > 0:
+                order.status = OrderStatus.CANCELLED
+                order.cancelled_timestep = order.timestep
+            self._invalidate_best()
+            return trades
 
-    def best_bid(self) -> Optional[float]:
-        while self.buys:
-            price, _, order = self.buys[0]
-            if order.status == OrderStatus.PENDING and order.quantity > 0:
-                return -price
+        # 带价格的市价单按自身价格撮合，剩余部分直接作为限价单挂出（不再另建订单）
+        order.order_type = OrderType.LIMIT
+        return self._submit_limit_order(order)
+
+    def _match(self, order: Order) -> np.ndarray:
+        """按价格-时间优先连续吃掉对手方档位，直到数量耗尽或价格不再交叉"""
+        is_buy = order.direction == OrderDirection.BUY
+        book = self.sells if is_buy else self.buys
+        # 未给价格的订单不设价格限制
+        limit = order.price
+        if limit is None:
+            limit = math.inf if is_buy else -math.inf
+        start = len(self.trade_log)
+
+        while order.quantity > 0:
+            level = self._top_level(book)
+            if level is None:
+                break
+            # 只有当对手方最优价符合本订单的价格时才成交
+            if (level.price > limit) if is_buy else (level.price < limit):
+                break
+
+            top_order = level.orders[0]
+            trade_qty = min(order.quantity, top_order.quantity)
+            trade_price = top_order.price
+
+            # 执行成交
+            order.execute(trade_price, order.timestep, trade_qty)
+            top_order.execute(trade_price, order.timestep, trade_qty)
+
+            # 记录成交信息
+            if is_buy:
+                self.trade_log.append(order.trader_id, top_order.trader_id, order.timestep, trade_price, trade_qty)
             else:
-                heapq.heappop(self.buys)
+                self.trade_log.append(top_order.trader_id, order.trader_id, order.timestep, trade_price, trade_qty)
+            # print(f"💥 TRADE: {order.order_id} <-> {top_order.order_id} at price={trade_price} qty={trade_qty}")
+
+            # 队首订单完全成交则出队，部分成交则保留在队首
+            if top_order.quantity <= 0:
+                level.orders.popleft()
+
+        return self.trade_log[start:]
+
+    def _top_level(self, book: SortedDict) -> Optional[PriceLevel]:
+        """返回最优档位，顺带惰性清理已失效的订单与空档位"""
+        while book:
+            price, level = book.peekitem(0)
+            orders = level.orders
+            while orders and (orders[0].status != OrderStatus.PENDING or orders[0].quantity <= 0):
+                orders.popleft()
+            if orders:
+                return level
+            del book[price]
         return None
 
+    def _invalidate_best(self):
+        self._best_bid = _STALE
+        self._best_ask = _STALE
+
+    def best_bid(self) -> Optional[float]:
+        if self._best_bid is _STALE:
+            level = self._top_level(self.buys)
+            self._best_bid = level.price if level is not None else None
+        return self._best_bid
+
     def best_ask(self) -> Optional[float]:
-        while self.sells:
-            price, _, order = self.sells[0]
-            if order.status == OrderStatus.PENDING and order.quantity > 0:
-                return price
-            else:
-                heapq.heappop(self.sells)
-        return None
+        if self._best_ask is _STALE:
+            level = self._top_level(self.sells)
+            self._best_ask = level.price if level is not None else None
+        return self._best_ask
+
+    def _iter_orders(self, book: SortedDict):
+        """按价格-时间优先顺序遍历仍然有效的挂单"""
+        for level in book.values():
+            for order in level.orders:
+                if order.status == OrderStatus.PENDING and order.quantity > 0:
+                    yield order
 
     def snapshot(self):
         return {
             "best_bid": self.best_bid(),
             "best_ask": self.best_ask(),
-            "buy_depth": len(self.buys),
-            "sell_depth": len(self.sells)
+            "buy_depth": sum(len(level.orders) for level in self.buys.values()),
+            "sell_depth": sum(len(level.orders) for level in self.sells.values())
         }
 
     def reset(self):
         self.buys.clear()
         self.sells.clear()
         self.trade_log.clear()
+        self._expiry.clear()
+        self._expiry_steps.clear()
+        self._invalidate_best()
 
     def cancel_timed_out_orders(self, current_timestamp):
-        """检查并取消所有超时未成交的订单"""
-        for entry in self.buys[:]:
-            _, _, order = entry
-            if order.check_timeout(current_timestamp):  # 使用时间步来检查超时
-                self.buys.remove(entry)  # 从买单簿中移除超时订单
-                # print(f"Order {order.order_id} has been cancelled due to timeout.")
-
-        for entry in self.sells[:]:
-            _, _, order = entry
-            if order.check_timeout(current_timestamp):  # 使用时间步来检查超时
-                self.sells.remove(entry)  # 从卖单簿中移除超时订单
-                # print(f"Order {order.order_id} has been cancelled due to timeout.")
-
-    def get_latest_trades(self) -> list:
+        """
+        取消所有超时未成交的订单。
+
+        只取出到期步不晚于当前时间步的登记订单，不再遍历整个订单簿；
+        仅重建含有超时订单的档位，空档位随之删除。
+        """
+        expiry_steps = self._expiry_steps
+        if not expiry_steps or expiry_steps[0] > current_timestamp:
+            # 本步没有到期的订单（最常见情形），不做任何分配直接返回
+            return
+        touched = set()
+        while expiry_steps and expiry_steps[0] <= current_timestamp:
+            for order in self._expiry.pop(heapq.heappop(expiry_steps)):
+                # 已成交的订单不再处理；check_timeout 负责标记 CANCELLED
+                if order.status == OrderStatus.PENDING and order.check_timeout(current_timestamp):
+                    touched.add((order.direction, order.price))
+                    # print(f"Order {order.order_id} has been cancelled due to timeout.")
+        if touched:
+            self._invalidate_best()
+        for direction, price in touched:
+            book = self.buys if direction == OrderDirection.BUY else self.sells
+            level = book.get(price)
+            if level is None:
+                continue
+            # 整档重建队列以剔除超时订单，避免逐个 list.remove 的 O(n) 开销
+            level.orders = deque(o for o in level.orders if o.status == OrderStatus.PENDING)
+            if not level.orders:
+                del book[price]
+
+    def get_latest_trades(self) -> np.ndarray:
         """获取最新的成交信息"""
-        return self.trade_log[-1:] if self.trade_log else []
+        return self.trade_log[-1:]
 
     def get_market_depth(self, levels: int = 5) -> Dict[str, Dict[float, int]]:
         """
@@ -158,22 +239,15 @@ class OrderBook:
                 'asks': {price: volume, ...}
             }
         """
-        # 获取买盘深度（注意：buys中的价格是负的，需要转换回正值）
+        # 获取买盘深度（按价格从高到低、同价按时间先后取前 levels 笔挂单）
         bids = {}
-        # 对买单按价格从高到低排序（因为buys中存储的是负价格，所以直接排序即可）
-        sorted_buys = sorted(self.buys, key=lambda x: x[0])
-        for price, _, order in sorted_buys[:levels]:
-            if order.status == OrderStatus.PENDING and order.quantity > 0:
-                actual_price = -price  # 转换回实际价格
-                bids[actual_price] = bids.get(actual_price, 0) + order.quantity
+        for order in itertools.islice(self._iter_orders(self.buys), levels):
+            bids[order.price] = bids.get(order.price, 0) + order.quantity
         
-        # 获取卖盘深度（sells中的价格已经是正值）
+        # 获取卖盘深度（按价格从低到高）
         asks = {}
-        # 对卖单按价格从低到高排序
-        sorted_sells = sorted(self.sells, key=lambda x: x[0])
-        for price, _, order in sorted_sells[:levels]:
-            if order.status == OrderStatus.PENDING and order.quantity > 0:
-                asks[price] = asks.get(price, 0) + order.quantity
+        for order in itertools.islice(self._iter_orders(self.sells), levels):
+            asks[order.price] = asks.get(order.price, 0) + order.quantity
         
         return {'bids': bids, 'asks': asks}
 
@@ -195,17 +269,15 @@ class OrderBook:
 
     def get_bid_volume(self, price: float) -> int:
         """获取指定价格的买单总量"""
-        volume = 0
-        for _, _, order in self.buys:
-            if order.status == OrderStatus.PENDING and order.quantity > 0 and -order.price == price:
-                volume += order.quantity
-        return volume
+        return self._level_volume(self.buys.get(price))
 
     def get_ask_volume(self, price: float) -> int:
         """获取指定价格的卖单总量"""
-        volume = 0
-        for _, _, order in self.sells:
-            if order.status == OrderStatus.PENDING and order.quantity > 0 and order.price == price:
-                volume += order.quantity
-        return volume
-        
\ No newline at end of file
+        return self._level_volume(self.sells.get(price))
+
+    @staticmethod
+    def _level_volume(level: Optional[PriceLevel]) -> int:
+        if level is None:
+            return 0
+        return sum(o.quantity for o in level.orders
+                   if o.status == OrderStatus.PENDING and o.quantity > 0)
@@ -1,6 +1,6 @@
-from dataclasses import dataclass, field
+import itertools
 from enum import Enum
-from typing import Optional, ClassVar
+from typing import Optional
 
 
 class OrderType(Enum):
@@ -19,27 +19,32 @@ class OrderStatus(Enum):
     CANCELLED = 'cancelled'
 
 
-@dataclass
-class Order:
-    _next_id: ClassVar[int] = 0  # 全局订单编号，用于时间排序
-
-    trader_id: int
-    max_wait_time: int
-    quantity: int
-    timestep: int
-    direction: OrderDirection
-    order_type: Optional[OrderType] = None
-    price: Optional[float] = None
-    order_id: int = field(init=False)
-    status: OrderStatus = field(default=OrderStatus.PENDING)
-    executed_price: Optional[float] = field(default=None, init=False)
-    executed_timestep: Optional[int] = field(default=None, init=False)
-    cancelled_timestep: Optional[int] = field(default=None, init=False)
-    
+# 全局订单编号生成器，用于时间排序（单次 C 层自增）
+_order_ids = itertools.count()
 
-    def __post_init__(self):
-        self.order_id = Order._next_id
-        Order._next_id += 1
+
+class Order:
+    # 订单创建频繁，显式声明 __slots__ 不分配 __dict__（dataclass 的 slots 参数需要 Python 3.10）
+    __slots__ = (
+        'trader_id', 'max_wait_time', 'quantity', 'timestep', 'direction', 'order_type', 'price',
+        'order_id', 'status', 'executed_price', 'executed_timestep', 'cancelled_timestep',
+    )
+
+    def __init__(self, trader_id: int, max_wait_time: int, quantity: int, timestep: int,
+                 direction: OrderDirection, order_type: Optional[OrderType] = None,
+                 price: Optional[float] = None, status: OrderStatus = OrderStatus.PENDING):
+        self.trader_id = trader_id
+        self.max_wait_time = max_wait_time
+        self.quantity = quantity
+        self.timestep = timestep
+        self.direction = direction
+        self.order_type = order_type
+        self.price = price
+        self.order_id = next(_order_ids)
+        self.status = status
+        self.executed_price: Optional[float] = None
+        self.executed_timestep: Optional[int] = None
+        self.cancelled_timestep: Optional[int] = None
 
     def execute(self, executed_price: float, executed_timestep: int, fill_qty: int):
         self.executed_price = executed_price
@@ -0,0 +1,52 @@
+import numpy as np
+
+# 成交记录的字段与原先 dict 形式的键保持一致
+TRADE_DTYPE = np.dtype([
+    ('buyer_id', np.int64),
+    ('seller_id', np.int64),
+    ('trade_timestamp', np.int64),
+    ('trade_price', np.float64),
+    ('trade_qty', np.int64),
+])
+
+
+class TradeLog:
+    """
+    成交日志：存放在预分配的 NumPy 结构化数组中，容量不足时倍增扩容。
+
+    支持 len()、布尔判断、下标与切片访问（返回结构化记录/数组视图），
+    记录可按字段名读取，如 trade_log[-1]['trade_price']。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.empty(capacity, dtype=TRADE_DTYPE)
+        self._size = 0
+
+    def append(self, buyer_id: int, seller_id: int, trade_timestamp: int,
+               trade_price: float, trade_qty: int):
+        if self._size == self._data.shape[0]:
+            grown = np.empty(max(1, self._size * 2), dtype=TRADE_DTYPE)
+            grown[:self._size] = self._data
+            self._data = grown
+        self._data[self._size] = (buyer_id, seller_id, trade_timestamp, trade_price, trade_qty)
+        self._size += 1
+
+    @property
+    def records(self) -> np.ndarray:
+        """当前全部成交记录（结构化数组视图，可按列取值）"""
+        return self._data[:self._size]
+
+    def clear(self):
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __iter__(self):
+        return iter(self.records)
@@ -0,0 +1,99 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def _sign(x):
+    if x > 0.0:
+        return 1
+    if x < 0.0:
+        return -1
+    return 0
+
+
+@njit(cache=True)
+def propagate_step(indptr, indices, infect_draws,
+                   emotion, is_attacker, cooldown, exposure, resilience,
+                   is_bullied, suppression, attack_strength, been_attacked,
+                   newly_bullied, dirty, log_attacker, log_victim, log_strength,
+                   cooldown_duration, exposure_threshold, base_suppression, max_suppression,
+                   sigmoid_k, shrink_factor, enable_infect, infect_prob, bully_amplify,
+                   enable_resilience, resilience_growth):
+    """
+    按交易者顺序执行一步网暴传播（与逐个交易者处理的顺序语义一致：
+    喷子攻击后立即进入冷却，本步内不再攻击排在后面的受害者）
+
+    Args:
+        indptr / indices: 邻接关系的 CSR 表示
+        infect_draws: 本步预先抽取的均匀随机数，第 i 个交易者的感染判定使用 infect_draws[i]
+        newly_bullied: 本步由未被网暴转为被网暴的交易者
+        dirty: 本步状态有变化、需要写回交易者对象的行
+        log_attacker / log_victim / log_strength: 本步攻击记录（行号与强度），长度不小于边数
+
+    Returns:
+        本步攻击次数，即攻击记录中写入的条数
+    """
+    n = emotion.shape[0]
+    n_attacks = 0
+    # 清空上一步的攻击记录
+    for j in range(n):
+        if attack_strength[j] != 0.0 or been_attacked[j]:
+            attack_strength[j] = 0.0
+            been_attacked[j] = False
+            dirty[j] = True
+
+    for i in range(n):
+        # 冷却自动减1
+        if cooldown[i] > 0:
+            cooldown[i] -= 1
+            dirty[i] = True
+
+        # 计算被攻击的强度
+        emotion_i = emotion[i]
+        sign_i = _sign(emotion_i)
+        attack_sum = 0.0
+        for p in range(indptr[i], indptr[i + 1]):
+            j = indices[p]
+            emotion_j = emotion[j]
+            if (is_attacker[j] and cooldown[j] == 0 and
+                    _sign(emotion_j) != sign_i and abs(emotion_j) > 1e-3):
+                strength = abs(emotion_j - emotion_i)
+                attack_sum += strength
+                cooldown[j] = cooldown_duration
+                attack_strength[j] = strength
+                dirty[j] = True
+                log_attacker[n_attacks] = j
+                log_victim[n_attacks] = i
+                log_strength[n_attacks] = strength
+                n_attacks += 1
+
+        if attack_sum > 0:
+            been_attacked[i] = True
+            # 累计攻击强度
+            exposure[i] += attack_sum * (1.0 - resilience[i])
+            dirty[i] = True
+
+        # 受网暴影响
+        if exposure[i] >= exposure_threshold:
+            if not is_bullied[i]:
+                newly_bullied[i] = True
+            is_bullied[i] = True
+            x = exposure[i] - exposure_threshold
+            sigmoid = 1 / (1 + np.exp(-sigmoid_k * x))
+            suppression[i] = base_suppression + (max_suppression - base_suppression) * sigmoid
+            emotion[i] *= shrink_factor
+            dirty[i] = True
+            # 正反馈：网暴感染
+            if enable_infect and not is_attacker[i] and infect_draws[i] < infect_prob:
+                is_attacker[i] = True
+                emotion[i] *= bully_amplify
+        else:
+            if is_bullied[i] or suppression[i] != 0.0:
+                dirty[i] = True
+            is_bullied[i] = False
+            suppression[i] = 0.0
+
+        # 负反馈3：心理承受能力提升
+        if enable_resilience and is_bullied[i]:
+            resilience[i] = min(1.0, resilience[i] + resilience_growth)
+    return n_attacks
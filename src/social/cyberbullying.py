@@ -1,17 +1,27 @@
 import networkx as nx
-import random
 import numpy as np
 import pandas as pd
 from datetime import datetime
+from src.social._kernels import propagate_step
+
+# 攻击记录的字段与原先 4 元组的顺序一致
+ATTACK_DTYPE = np.dtype([
+    ('attacker_id', np.int64),
+    ('victim_id', np.int64),
+    ('strength', np.float64),
+    ('timestep', np.int64),
+])
 
 class CyberbullyingModel:
     def __init__(self, config, traders):
         self.config = config
         self.network = None
         self.bully_count = {}  # 记录每个trader被网暴次数
-        self.attack_log = []   # 记录本步所有攻击 (attacker_id, victim_id, strength, timestep)
+        self.attack_log = np.empty(0, dtype=ATTACK_DTYPE)  # 记录本步所有攻击 (attacker_id, victim_id, strength, timestep)
         self.timestep = 0
         self.traders = traders
+        self._emotion = None  # 网暴状态数组，build_network 或首次传播时建立
+        self._params = None   # 网暴机制参数，首次传播时读取
 
     def build_network(self):
         # 只处理散户
@@ -22,18 +32,23 @@ class CyberbullyingModel:
         seed = self.config["simulation"].get("random_seed", 42)
         p_born_bully = self.config["social"].get("born_bully_ratio", 0.1)
 
-        random.seed(seed)
-        np.random.seed(seed)
+        # 网络结构与天生喷子只由配置种子决定，不重设全局随机状态
+        rng = np.random.default_rng(seed)
 
         if net_type == "small_world":
-            G = nx.watts_strogatz_graph(n, k=avg_k, p=0.3)
+            G = nx.watts_strogatz_graph(n, k=avg_k, p=0.3, seed=seed)
         elif net_type == "random":
-            G = nx.erdos_renyi_graph(n, p=avg_k / (n - 1))
+            G = nx.erdos_renyi_graph(n, p=avg_k / (n - 1), seed=seed)
         else:
             raise ValueError("Unsupported network_type")
 
         self.network = G
 
+        # 初始化少数"天生喷子"：一次性抽取是否为喷子、情绪方向与强度
+        born_bully = rng.random(n) < p_born_bully
+        bully_sign = np.where(rng.random(n) < 0.5, 1, -1)
+        bully_bias = bully_sign * rng.uniform(0.1, 0.2, n)
+
         for i, trader in enumerate(retail_traders):
             trader.neighbors = [retail_traders[j] for j in G.neighbors(i)]
             trader.exposure = 0.0
@@ -46,126 +61,179 @@ class CyberbullyingModel:
             trader.last_attackers = []
             self.bully_count[trader.trader_id] = 0
             
-            # 初始化少数"天生喷子"
-            if np.random.rand() < p_born_bully:
-                trader.is_attacker = True
-                sign = 1 if np.random.rand() < 0.5 else -1
-                trader.emotion_bias = sign * np.random.uniform(0.1, 0.2)
-            else:
-                trader.is_attacker = False
-
-    def propagate(self):
-        if not self.config["social"].get("enable_cyberbullying", False):
-            return
-        self.timestep += 1
-        exposure_threshold = self.config["social"].get("exposure_threshold", 0.01)
-        cooldown_duration = self.config["social"].get("cooldown_duration", 3)
-        suppression_base = self.config["social"].get("suppression_prob", 0.5)
-        resilience_growth = self.config["social"].get("resilience_growth", 0.01)
-        recovery_shrink = self.config["social"].get("exposure_shrink_factor", 0.9)
-        # 正反馈参数
-        enable_bully_infect = self.config["social"].get("enable_bully_infect", False)
-        bully_infect_prob = self.config["social"].get("bully_infect_prob", 0.01)
-        # 负反馈参数
-        enable_regulator = self.config["social"].get("enable_regulator", False)
-        regulator_interval = self.config["social"].get("regulator_interval", 10)
-        regulator_cooldown = self.config["social"].get("regulator_cooldown", 10)
-        enable_bully_report = self.config["social"].get("enable_bully_report", False)
-        regulator_report_prob = self.config["social"].get("regulator_report_prob", 0.1)
-        regulator_report_cooldown = self.config["social"].get("regulator_report_cooldown", 8)
-        enable_bully_resilience = self.config["social"].get("enable_bully_resilience", True)
-        bully_amplify = self.config["social"].get("bully_amplify", 1.5)
-        self.attack_log = []
-        # 先清空所有trader的攻击记录
-        for trader in self.traders:
+            trader.is_attacker = bool(born_bully[i])
+            if trader.is_attacker:
+                trader.emotion_bias = float(bully_bias[i])
+
+        self._build_state()
+
+    def _build_state(self):
+        """
+        将网暴相关状态整理为按 self.traders 顺序排列的数组，邻居关系转为 CSR 下标。
+        此后数组为状态的唯一来源，每步只把有变化的行写回交易者对象
+        """
+        traders = self.traders
+        n = len(traders)
+        position = {id(trader): i for i, trader in enumerate(traders)}
+        # trader_id -> 行号，监管/举报按编号定位攻击者（编号重复时取第一个，与顺序查找一致）
+        self._index_by_id = {}
+        for i, trader in enumerate(traders):
+            self._index_by_id.setdefault(trader.trader_id, i)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indices = []
+        for i, trader in enumerate(traders):
+            indices.extend(position[id(neighbor)] for neighbor in trader.neighbors)
+            indptr[i + 1] = len(indices)
+        self._indptr = indptr
+        self._indices = np.asarray(indices, dtype=np.int64)
+
+        self._emotion = np.array([t.emotion_bias for t in traders], dtype=np.float64)
+        self._is_attacker = np.array([t.is_attacker for t in traders], dtype=np.bool_)
+        self._cooldown = np.array([t.bully_cooldown for t in traders], dtype=np.int64)
+        self._exposure = np.array([t.exposure for t in traders], dtype=np.float64)
+        self._resilience = np.array([t.resilience for t in traders], dtype=np.float64)
+        self._is_bullied = np.array([t.is_bullied for t in traders], dtype=np.bool_)
+        self._suppression = np.array([t.suppression for t in traders], dtype=np.float64)
+        self._attack_strength = np.zeros(n, dtype=np.float64)
+        self._been_attacked = np.zeros(n, dtype=np.bool_)
+        self._newly_bullied = np.zeros(n, dtype=np.bool_)
+        self._dirty = np.zeros(n, dtype=np.bool_)
+        self._no_draws = np.zeros(n, dtype=np.float64)  # 未启用感染时传入内核的占位数组
+        # 本步攻击记录缓冲区：每条边每步至多攻击一次，按边数预分配
+        n_edges = self._indices.shape[0]
+        self._log_attacker = np.empty(n_edges, dtype=np.int64)
+        self._log_victim = np.empty(n_edges, dtype=np.int64)
+        self._log_strength = np.empty(n_edges, dtype=np.float64)
+        self._trader_ids = np.array([t.trader_id for t in traders], dtype=np.int64)
+        for trader in traders:
             trader.last_attack_strength = 0.0
             trader.last_been_attacked = False
             trader.last_attackers = []
 
-        any_attack = False
-        any_bullied = False
+    def _write_back(self):
+        """把本步有变化的行写回交易者对象（交易者决策与分析读取这些属性）"""
+        rows = np.flatnonzero(self._dirty)
+        if rows.size == 0:
+            return
+        traders = self.traders
+        for i, emotion, attacker, cooldown, exposure, resilience, bullied, suppression, strength, attacked in zip(
+                rows.tolist(),
+                self._emotion[rows].tolist(),
+                self._is_attacker[rows].tolist(),
+                self._cooldown[rows].tolist(),
+                self._exposure[rows].tolist(),
+                self._resilience[rows].tolist(),
+                self._is_bullied[rows].tolist(),
+                self._suppression[rows].tolist(),
+                self._attack_strength[rows].tolist(),
+                self._been_attacked[rows].tolist()):
+            trader = traders[i]
+            trader.emotion_bias = emotion
+            trader.is_attacker = attacker
+            trader.bully_cooldown = cooldown
+            trader.exposure = exposure
+            trader.resilience = resilience
+            trader.is_bullied = bullied
+            trader.suppression = suppression
+            trader.last_attack_strength = strength
+            trader.last_been_attacked = attacked
+
+    def _add_cooldown(self, index, extra):
+        """监管/举报惩罚：延长第 index 个交易者的攻击冷却"""
+        self._cooldown[index] += extra
+        self.traders[index].bully_cooldown = int(self._cooldown[index])
+
+    def _read_params(self) -> dict:
+        """网暴机制参数：一次模拟内配置不变，首次传播时读取一次"""
+        social = self.config["social"]
+        return {
+            "enable_cyberbullying": social.get("enable_cyberbullying", False),
+            "enable_bully_infect": social.get("enable_bully_infect", False),
+            # 传入传播内核的参数（顺序与 propagate_step 的参数一致）
+            "kernel_args": (
+                social.get("cooldown_duration", 3),
+                social.get("exposure_threshold", 0.01),
+                social.get("suppression_prob", 0.5),
+                social.get("max_suppression", 0.95),
+                social.get("sigmoid_k", 1.0),
+                social.get("emotion_shrink_factor", 0.8),
+                # 正反馈参数
+                social.get("enable_bully_infect", False),
+                social.get("bully_infect_prob", 0.01),
+                social.get("bully_amplify", 1.5),
+                # 负反馈3：心理承受能力提升
+                social.get("enable_bully_resilience", True),
+                social.get("resilience_growth", 0.01),
+            ),
+            # 负反馈参数
+            "enable_regulator": social.get("enable_regulator", False),
+            "regulator_interval": social.get("regulator_interval", 10),
+            "regulator_cooldown": social.get("regulator_cooldown", 10),
+            "enable_bully_report": social.get("enable_bully_report", False),
+            "regulator_report_prob": social.get("regulator_report_prob", 0.1),
+            "regulator_report_cooldown": social.get("regulator_report_cooldown", 8),
+        }
 
-        for trader in self.traders:
-            if not hasattr(trader, "neighbors"):
-                continue
-            # 冷却自动减1
-            if hasattr(trader, "bully_cooldown"):
-                trader.bully_cooldown = max(0, trader.bully_cooldown - 1)
-            
+    def propagate(self):
+        params = self._params
+        if params is None:
+            params = self._params = self._read_params()
+        if not params["enable_cyberbullying"]:
+            return
+        if self._emotion is None:
+            self._build_state()
+        self.timestep += 1
+
+        # 逐个受害者的攻击、曝光、沉默与感染更新在编译内核中完成，
+        # 感染判定所需的随机数每步一次性抽取（未启用感染时不抽取）
+        self._newly_bullied[:] = False
+        self._dirty[:] = False
+        kernel_args = params["kernel_args"]
+        if params["enable_bully_infect"]:
+            infect_draws = np.random.random_sample(len(self.traders))
+        else:
+            infect_draws = self._no_draws
+        n_attacks = propagate_step(
+            self._indptr, self._indices, infect_draws,
+            self._emotion, self._is_attacker, self._cooldown, self._exposure, self._resilience,
+            self._is_bullied, self._suppression, self._attack_strength, self._been_attacked,
+            self._newly_bullied, self._dirty,
+            self._log_attacker, self._log_victim, self._log_strength, *kernel_args)
+        attack_rows = self._log_attacker[:n_attacks]
+        attack_strength = self._log_strength[:n_attacks]
+        attack_log = np.empty(n_attacks, dtype=ATTACK_DTYPE)
+        attack_log['attacker_id'] = self._trader_ids[attack_rows]
+        attack_log['victim_id'] = self._trader_ids[self._log_victim[:n_attacks]]
+        attack_log['strength'] = attack_strength
+        attack_log['timestep'] = self.timestep
+        self.attack_log = attack_log
+
+        for i in np.flatnonzero(self._newly_bullied).tolist():
+            self.bully_count[self.traders[i].trader_id] += 1
+        self._write_back()
 
-            # 计算被攻击的强度
-            attack_sum = 0
-            attackers = []
-            for neighbor in trader.neighbors:
-                if (
-                    getattr(neighbor, "is_attacker", False) and
-                    getattr(neighbor, "bully_cooldown", 0) == 0 and
-                    np.sign(neighbor.emotion_bias) != np.sign(trader.emotion_bias) and
-                    abs(neighbor.emotion_bias) > 1e-3
-                ):
-                    opinion_diff = abs(neighbor.emotion_bias - trader.emotion_bias)
-                    attack_strength = opinion_diff
-                    attack_sum += attack_strength
-                    neighbor.bully_cooldown = cooldown_duration
-                    neighbor.last_attack_strength = attack_strength
-                    # self.attack_log.append((neighbor.trader_id, trader.trader_id, attack_strength, self.timestep))
-                    # attackers.append(neighbor.trader_id)
-                    any_attack = True
-
-            # if attack_sum == 0:
-            #     trader.exposure *= recovery_shrink
-
-            trader.last_been_attacked = attack_sum > 0
-            trader.last_attackers = attackers
-            # 累计攻击强度
-            effective_exposure = attack_sum * (1.0 - trader.resilience)
-            trader.exposure += effective_exposure
-            # 受网暴影响
-            if trader.exposure >= exposure_threshold:
-                if not trader.is_bullied:
-                    self.bully_count[trader.trader_id] += 1
-                trader.is_bullied = True
-                any_bullied = True
-                # suppression等逻辑不变
-                k = self.config["social"].get("sigmoid_k", 1.0)
-                max_suppression = self.config["social"].get("max_suppression", 0.95)
-                base_suppression = suppression_base
-                x = trader.exposure - exposure_threshold
-                sigmoid = 1 / (1 + np.exp(-k * x))
-                trader.suppression = base_suppression + (max_suppression - base_suppression) * sigmoid
-                shrink_factor = self.config["social"].get("emotion_shrink_factor", 0.8)
-                trader.emotion_bias *= shrink_factor
-                # 正反馈：网暴感染
-                if enable_bully_infect and not trader.is_attacker:
-                    if np.random.rand() < bully_infect_prob:
-                        trader.is_attacker = True
-                        trader.emotion_bias *= bully_amplify
-            else:
-                trader.is_bullied = False
-                trader.suppression = 0.0
-
-            # 负反馈3：心理承受能力提升
-            if enable_bully_resilience and trader.is_bullied:
-                trader.resilience = min(1.0, trader.resilience + resilience_growth)
-                
         # 负反馈1：监管者巡视
-        if enable_regulator and self.timestep % regulator_interval == 0:
-            for attacker_id, victim_id, strength, timestep in self.attack_log:
-                attacker = next((t for t in self.traders if t.trader_id == attacker_id), None)
-                if attacker:
-                    attacker.bully_cooldown += int(regulator_cooldown * strength)
-
-        # 负反馈2：举报
-        if enable_bully_report:
-            for trader in self.traders:
-                if trader.is_bullied and trader.last_attackers:
-                    for attacker_id in trader.last_attackers:
-                        if np.random.rand() < regulator_report_prob:
-                            attacker = next((t for t in self.traders if t.trader_id == attacker_id), None)
-                            if attacker:
-                                attacker.bully_cooldown += regulator_report_cooldown
-
-        # print(f"[Cyberbullying] Any attack: {any_attack}, Any bullied: {any_bullied}, Timestep: {self.timestep}")
+        if params["enable_regulator"] and self.timestep % params["regulator_interval"] == 0:
+            # 按行号一次性累加冷却惩罚（同一攻击者多次攻击时逐条累加）
+            penalty = (params["regulator_cooldown"] * attack_strength).astype(np.int64)
+            np.add.at(self._cooldown, attack_rows, penalty)
+            for index in np.unique(attack_rows).tolist():
+                self.traders[index].bully_cooldown = int(self._cooldown[index])
+
+        # 负反馈2：举报（所有被网暴者的举报判定一次性抽取随机数）
+        if params["enable_bully_report"]:
+            reports = [attacker_id
+                       for i in np.flatnonzero(self._is_bullied).tolist()
+                       for attacker_id in self.traders[i].last_attackers]
+            if reports:
+                succeeded = np.random.random_sample(len(reports)) < params["regulator_report_prob"]
+                for attacker_id, success in zip(reports, succeeded.tolist()):
+                    if success:
+                        index = self._index_by_id.get(attacker_id)
+                        if index is not None:
+                            self._add_cooldown(index, params["regulator_report_cooldown"])
+
+        # print(f"[Cyberbullying] Timestep: {self.timestep}, Newly bullied: {int(self._newly_bullied.sum())}")
 
     def export_bully_count(self, path="results/cyberbullying/网暴次数.xlsx"):
         df = pd.DataFrame(list(self.bully_count.items()), columns=["trader_id", "bully_count"])
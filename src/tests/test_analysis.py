@@ -0,0 +1,119 @@
+import unittest
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import stats
+from src.analysis._kernels import moments, rolling_std, sorted_mean_gini
+
+
+class TestMoments(unittest.TestCase):
+    """单次遍历矩估计与原先 pandas skew()/kurtosis() 的结果保持一致"""
+
+    def test_matches_scipy_unbiased_skew_and_excess_kurtosis(self):
+        x = np.random.default_rng(0).standard_normal(500) * 0.01
+        mean, std, skew, kurt = moments(x)
+        self.assertAlmostEqual(mean, x.mean(), places=12)
+        self.assertAlmostEqual(std, x.std(), places=12)
+        # pandas 的偏度/峰度即 scipy 的无偏修正（bias=False），峰度为超额峰度（fisher=True）
+        self.assertAlmostEqual(skew, stats.skew(x, bias=False), places=10)
+        self.assertAlmostEqual(kurt, stats.kurtosis(x, fisher=True, bias=False), places=10)
+
+    def test_heavy_tailed_series(self):
+        x = np.random.default_rng(1).standard_t(3, size=2000) * 0.02 + 0.001
+        _, _, skew, kurt = moments(x)
+        self.assertAlmostEqual(skew, stats.skew(x, bias=False), places=8)
+        self.assertAlmostEqual(kurt, stats.kurtosis(x, fisher=True, bias=False), places=8)
+
+    def test_constant_series_matches_pandas(self):
+        # 零方差时 scipy 返回 NaN，原先使用的 pandas 返回 0，这里沿用 pandas 的结果
+        x = np.full(10, 0.003)
+        mean, std, skew, kurt = moments(x)
+        self.assertAlmostEqual(mean, 0.003)
+        self.assertEqual(std, 0.0)
+        self.assertEqual(skew, pd.Series(x).skew())
+        self.assertEqual(kurt, pd.Series(x).kurtosis())
+        self.assertEqual((skew, kurt), (0.0, 0.0))
+
+    def test_length_one_series_is_undefined(self):
+        x = np.array([0.1])
+        mean, std, skew, kurt = moments(x)
+        self.assertEqual((mean, std), (0.1, 0.0))
+        self.assertTrue(np.isnan(skew) and np.isnan(pd.Series(x).skew()))
+        self.assertTrue(np.isnan(kurt) and np.isnan(pd.Series(x).kurtosis()))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.assertTrue(np.isnan(stats.skew(x, bias=False)))
+
+
+
+class TestRollingStd(unittest.TestCase):
+    """滑动 Welford 窗口与原先 pd.Series.rolling(window).std() 的结果保持一致"""
+
+    def _pandas(self, x, window):
+        return pd.Series(x).rolling(window).std().to_numpy()
+
+    def test_matches_pandas_with_nan_before_first_full_window(self):
+        x = np.random.default_rng(0).standard_normal(300) * 0.01
+        out = rolling_std(x, 20)
+        self.assertTrue(np.isnan(out[:19]).all())
+        np.testing.assert_allclose(out, self._pandas(x, 20), rtol=1e-10, atol=1e-15, equal_nan=True)
+
+    def test_window_of_one_is_all_nan(self):
+        x = np.random.default_rng(1).standard_normal(5)
+        out = rolling_std(x, 1)
+        self.assertTrue(np.isnan(out).all())
+        self.assertTrue(np.isnan(self._pandas(x, 1)).all())
+
+    def test_window_longer_than_series_is_all_nan(self):
+        x = np.random.default_rng(2).standard_normal(5)
+        out = rolling_std(x, 10)
+        self.assertEqual(out.shape, x.shape)
+        self.assertTrue(np.isnan(out).all())
+        self.assertTrue(np.isnan(self._pandas(x, 10)).all())
+
+    def test_large_offset_does_not_cancel(self):
+        # 以 1e6 为均值、1e-3 量级的波动：平方和相减的做法在这里会完全失真
+        noise = np.random.default_rng(3).standard_normal(300) * 1e-3
+        x = 1e6 + noise
+        expected = self._pandas(x - 1e6, 20)
+        np.testing.assert_allclose(rolling_std(x, 20), expected, rtol=1e-5, equal_nan=True)
+        np.testing.assert_allclose(self._pandas(x, 20), expected, rtol=1e-5, equal_nan=True)
+
+
+
+def _reference_gini(wealths):
+    """原 wealth_effect.gini_coefficient 的实现"""
+    wealths = np.sort(wealths)
+    n = len(wealths)
+    index = np.arange(1, n + 1)
+    return ((2 * index - n - 1) * wealths).sum() / (n * wealths.sum())
+
+
+class TestSortedMeanGini(unittest.TestCase):
+    """单次遍历的均值/基尼系数与原 gini_coefficient 的结果保持一致"""
+
+    def test_random_wealth_matches_reference(self):
+        rng = np.random.default_rng(0)
+        for wealths in (rng.lognormal(10, 1, 200), rng.uniform(0, 1e5, 7), rng.pareto(2.0, 1000)):
+            mean, gini = sorted_mean_gini(np.sort(wealths))
+            self.assertAlmostEqual(mean, wealths.mean(), delta=1e-9 * wealths.mean())
+            self.assertAlmostEqual(gini, _reference_gini(wealths), places=12)
+
+    def test_all_equal_wealth_has_zero_gini(self):
+        wealths = np.full(50, 3000.0)
+        mean, gini = sorted_mean_gini(wealths)
+        self.assertEqual(mean, 3000.0)
+        self.assertAlmostEqual(gini, 0.0, places=12)
+        self.assertAlmostEqual(_reference_gini(wealths), 0.0, places=12)
+
+    def test_all_zero_wealth_is_defined(self):
+        mean, gini = sorted_mean_gini(np.zeros(10))
+        self.assertEqual((mean, gini), (0.0, 0.0))
+
+    def test_empty_wealth_is_nan(self):
+        mean, gini = sorted_mean_gini(np.empty(0))
+        self.assertTrue(np.isnan(mean) and np.isnan(gini))
+
+
+if __name__ == '__main__':
+    unittest.main()
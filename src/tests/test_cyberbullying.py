@@ -13,6 +13,7 @@ class DummyTrader:
         self.type = 'retail'
         self.emotion_bias = emotion_bias
         self.is_natural_bully = is_natural_bully
+        self.is_attacker = is_natural_bully
         self.neighbors = []
         self.exposure = 0.0
         self.resilience = 0.0
@@ -43,10 +44,107 @@ def test_cyberbullying_trigger():
     t0.neighbors = [t1]
     t1.neighbors = [t0]
     traders = [t0, t1]
-    model = CyberbullyingModel(config)
+    model = CyberbullyingModel(config, traders)
     model.bully_count = {0: 0, 1: 0}
     # 多轮传播
     for _ in range(5):
-        model.propagate(traders)
+        model.propagate()
     # 至少有一个trader被网暴
-    assert model.bully_count[0] > 0 or model.bully_count[1] > 0, f"No bullying occurred: {model.bully_count}" 
\ No newline at end of file
+    assert model.bully_count[0] > 0 or model.bully_count[1] > 0, f"No bullying occurred: {model.bully_count}"
+    # 状态数组写回交易者对象，交易者决策读取的是对象属性
+    assert t0.is_bullied or t1.is_bullied
+    assert t0.exposure > 0 or t1.exposure > 0
+
+
+def test_regulator_penalizes_logged_attackers():
+    # 监管者每步巡视：按本步攻击记录延长攻击者冷却
+    config = {
+        'social': {
+            'enable_cyberbullying': True,
+            'exposure_threshold': 0.01,
+            'cooldown_duration': 1,
+            'enable_regulator': True,
+            'regulator_interval': 1,
+            'regulator_cooldown': 10,
+        },
+        'simulation': {'random_seed': 42}
+    }
+    attacker = DummyTrader(0, 1.0, is_natural_bully=True)
+    victim = DummyTrader(1, -1.0)
+    attacker.neighbors = [victim]
+    victim.neighbors = [attacker]
+    model = CyberbullyingModel(config, [attacker, victim])
+    model.bully_count = {0: 0, 1: 0}
+    model.propagate()
+    assert len(model.attack_log) == 1
+    assert (model.attack_log[0]['attacker_id'], model.attack_log[0]['victim_id']) == (0, 1)
+    assert model.attack_log[0]['strength'] == 2.0
+    # 攻击冷却 1 步 + 监管惩罚 int(10 * 2.0)
+    assert attacker.bully_cooldown == 21
+
+
+def _attack_rows(model):
+    return [(int(r['attacker_id']), int(r['victim_id']), float(r['strength']), int(r['timestep']))
+            for r in model.attack_log]
+
+
+def test_attack_log_rows_on_fixed_graph():
+    # 固定小图：喷子 10、11 情绪为正，受害者 12、13 情绪为负；阈值很高，情绪不收缩
+    config = {
+        'social': {
+            'enable_cyberbullying': True,
+            'exposure_threshold': 100.0,
+            'cooldown_duration': 1,
+        },
+        'simulation': {'random_seed': 42}
+    }
+    a = DummyTrader(10, 1.0, is_natural_bully=True)
+    v = DummyTrader(12, -1.0)
+    b = DummyTrader(11, 0.5, is_natural_bully=True)
+    w = DummyTrader(13, -0.5)
+    a.neighbors = [v, w]
+    v.neighbors = [a, b]
+    b.neighbors = [v]
+    w.neighbors = [a]
+    model = CyberbullyingModel(config, [a, v, b, w])
+    model.bully_count = {10: 0, 11: 0, 12: 0, 13: 0}
+
+    # 第 1 步：12 先被 10、11 攻击，两者随即进入冷却，13 本步不再被 10 攻击
+    model.propagate()
+    assert _attack_rows(model) == [(10, 12, 2.0, 1), (11, 12, 1.5, 1)]
+    # 11 排在 12 之后，本步内冷却已减回 0；10 的冷却到第 2 步处理到它时才减回 0
+    assert (a.bully_cooldown, b.bully_cooldown) == (1, 0)
+    # 第 2 步：两者再次攻击 12，13 仍因 10 攻击 12 后的冷却而未被攻击
+    model.propagate()
+    assert _attack_rows(model) == [(10, 12, 2.0, 2), (11, 12, 1.5, 2)]
+    assert v.exposure == pytest.approx(7.0)
+    assert w.exposure == 0.0
+
+
+def test_attack_log_one_attack_per_edge_per_step():
+    # 无冷却时每个喷子攻击所有异号邻居，但每条边每步只记录一次
+    config = {
+        'social': {
+            'enable_cyberbullying': True,
+            'exposure_threshold': 100.0,
+            'cooldown_duration': 0,
+        },
+        'simulation': {'random_seed': 42}
+    }
+    a = DummyTrader(0, 1.0, is_natural_bully=True)
+    b = DummyTrader(1, 0.5, is_natural_bully=True)
+    v = DummyTrader(2, -1.0, is_natural_bully=True)
+    w = DummyTrader(3, -0.5)
+    a.neighbors = [v, w]
+    b.neighbors = [v, w]
+    v.neighbors = [a, b]
+    w.neighbors = [a, b]
+    model = CyberbullyingModel(config, [a, b, v, w])
+    model.bully_count = {0: 0, 1: 0, 2: 0, 3: 0}
+    expected = {(2, 0), (2, 1), (0, 2), (1, 2), (0, 3), (1, 3)}
+    for step in range(1, 4):
+        model.propagate()
+        pairs = [(row[0], row[1]) for row in _attack_rows(model)]
+        assert len(pairs) == len(set(pairs))
+        assert set(pairs) == expected
+        assert (model.attack_log['timestep'] == step).all()
@@ -1,5 +1,6 @@
 import unittest
 from src.order.orderbooks import OrderBook
+from src.order.trades import TradeLog
 from src.market.structure import Market
 from src.traders.retail import RetailTrader
 from src.traders.institutional import InstitutionalTrader
@@ -36,7 +37,7 @@ class TestMarketComplex(unittest.TestCase):
         self.assertGreaterEqual(order_count, 1, "No orders submitted")
 
         # 检查是否至少有部分成交（可能不是所有都成交）
-        self.assertIsInstance(self.orderbook.trade_log, list)
+        self.assertIsInstance(self.orderbook.trade_log, TradeLog)
         print(f"[Debug] Trade count: {len(self.orderbook.trade_log)}")
         print(f"[Debug] Final price: {self.market.price_history[-1] if self.market.price_history else 'N/A'}")
 
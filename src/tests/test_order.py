@@ -1,33 +1,148 @@
 import unittest
-from src.order.orders import Order, OrderDirection, OrderType
-from src.order.orderbooks import OrderBook 
+from src.order.orders import Order, OrderDirection, OrderType, OrderStatus
+from src.order.orderbooks import OrderBook
+from src.order.trades import TradeLog
 class TestOrderBook(unittest.TestCase):
 
     def setUp(self):
         """初始化订单簿和订单"""
         self.orderbook = OrderBook()
 
+    def _order(self, trader_id, order_type, direction, quantity, timestep, price, max_wait_time=10):
+        return Order(trader_id=trader_id, max_wait_time=max_wait_time, quantity=quantity,
+                     timestep=timestep, direction=direction, order_type=order_type, price=price)
+
     def test_trader_decides_to_submit_market_order(self):
         """测试交易者在市价合适时选择提交市价单"""
-        buy_order = Order(1, OrderType.LIMIT, OrderDirection.BUY, 500, 0, price=10.1)
+        buy_order = self._order(1, OrderType.LIMIT, OrderDirection.BUY, 500, 0, price=10.1)
         sell_orders = [
-            Order(2, OrderType.MARKET, OrderDirection.SELL, 200, 1, price=10.0),  # 可成交
-            Order(3, OrderType.MARKET, OrderDirection.SELL, 200, 2, price=10.1),  # 可成交
-            Order(4, OrderType.LIMIT, OrderDirection.SELL, 500, 3, price=10.2)   # 不可成交
+            self._order(2, OrderType.MARKET, OrderDirection.SELL, 200, 1, price=10.0),  # 可成交
+            self._order(3, OrderType.MARKET, OrderDirection.SELL, 200, 2, price=10.1),  # 可成交
+            self._order(4, OrderType.LIMIT, OrderDirection.SELL, 500, 3, price=10.2)   # 不可成交
         ]
         self.orderbook.submit_order(buy_order)
         for sell_order in sell_orders:
             self.orderbook.submit_order(sell_order)
-        self.assertEqual(self.orderbook.buys[0][2].quantity, 100)
-        self.assertEqual(self.orderbook.sells[0][2].quantity, 500)
+        self.assertEqual(self.orderbook.best_bid(), 10.1)
+        self.assertEqual(self.orderbook.get_bid_volume(10.1), 100)
+        self.assertEqual(self.orderbook.best_ask(), 10.2)
+        self.assertEqual(self.orderbook.get_ask_volume(10.2), 500)
 
-        new_order = Order(5, OrderType.MARKET, OrderDirection.BUY, 500, 4, price=10.2)
+        new_order = self._order(5, OrderType.MARKET, OrderDirection.BUY, 500, 4, price=10.2)
         self.orderbook.submit_order(new_order)
-        self.assertEqual(self.orderbook.buys[0][2].quantity, 100)
-        self.assertEqual(len(self.orderbook.buys), 1)
-        self.assertEqual(len(self.orderbook.sells), 0)
-        print(self.orderbook.trade_log)
-    
+        self.assertEqual(self.orderbook.get_bid_volume(10.1), 100)
+        self.assertIsNone(self.orderbook.best_ask())
+        self.assertEqual(len(self.orderbook.trade_log), 3)
+
+    def test_same_price_orders_fill_in_time_priority(self):
+        """同一价位先到的挂单先成交"""
+        first = self._order(1, OrderType.LIMIT, OrderDirection.BUY, 100, 0, price=10.0)
+        second = self._order(2, OrderType.LIMIT, OrderDirection.BUY, 100, 1, price=10.0)
+        self.orderbook.submit_order(first)
+        self.orderbook.submit_order(second)
+
+        self.orderbook.submit_order(self._order(3, OrderType.MARKET, OrderDirection.SELL, 150, 2, price=10.0))
+        self.assertEqual(first.quantity, 0)
+        self.assertEqual(second.quantity, 50)
+        self.assertEqual([t['buyer_id'] for t in self.orderbook.trade_log], [1, 2])
+
+    def test_marketable_limit_order_sweeps_levels(self):
+        """可成交的限价单一次吃掉多个档位，剩余部分按自身限价挂单"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.0))
+        self.orderbook.submit_order(self._order(2, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.1))
+        self.orderbook.submit_order(self._order(3, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.3))
+
+        trades = self.orderbook.submit_order(self._order(4, OrderType.LIMIT, OrderDirection.BUY, 250, 1, price=10.2))
+        self.assertEqual([(t['trade_price'], t['trade_qty']) for t in trades], [(10.0, 100), (10.1, 100)])
+        self.assertEqual(self.orderbook.best_bid(), 10.2)
+        self.assertEqual(self.orderbook.get_bid_volume(10.2), 50)
+        self.assertEqual(self.orderbook.best_ask(), 10.3)
+
+    def test_market_order_remainder_rests_as_same_order(self):
+        """市价单未成交的剩余部分以原订单身份转为限价单挂出"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.0))
+        market_order = self._order(2, OrderType.MARKET, OrderDirection.BUY, 300, 1, price=10.0)
+        self.orderbook.submit_order(market_order)
+
+        self.assertEqual(len(self.orderbook.trade_log), 1)
+        self.assertEqual(market_order.order_type, OrderType.LIMIT)
+        self.assertIs(self.orderbook.buys[10.0].orders[0], market_order)
+        self.assertEqual(self.orderbook.get_bid_volume(10.0), 200)
+
+    def test_unpriced_market_order_sweeps_and_cancels_remainder(self):
+        """不带价格的市价单不受价格限制地吃单，剩余部分撤销而不挂单"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.BUY, 100, 0, price=10.0))
+        self.orderbook.submit_order(self._order(2, OrderType.LIMIT, OrderDirection.BUY, 100, 0, price=9.0))
+        market_order = self._order(3, OrderType.MARKET, OrderDirection.SELL, 300, 1, price=None)
+
+        trades = self.orderbook.submit_order(market_order)
+        self.assertEqual([(t['trade_price'], t['trade_qty']) for t in trades], [(10.0, 100), (9.0, 100)])
+        self.assertEqual(market_order.status, OrderStatus.CANCELLED)
+        self.assertIsNone(self.orderbook.best_bid())
+        self.assertIsNone(self.orderbook.best_ask())
+
+    def test_timed_out_orders_leave_the_book(self):
+        """超时订单被撤销后不再参与撮合"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.0, max_wait_time=2))
+        self.orderbook.cancel_timed_out_orders(3)
+        self.assertIsNone(self.orderbook.best_ask())
+        self.assertEqual(self.orderbook.get_ask_volume(10.0), 0)
+
+    def test_timeout_only_removes_expired_orders_from_level(self):
+        """同一档位中只撤销已到期的订单，未到期订单保留原有时间优先级"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.BUY, 100, 0, price=10.0, max_wait_time=2))
+        self.orderbook.submit_order(self._order(2, OrderType.LIMIT, OrderDirection.BUY, 50, 1, price=10.0, max_wait_time=5))
+        self.orderbook.cancel_timed_out_orders(2)
+        self.assertEqual(self.orderbook.get_bid_volume(10.0), 150)
+        self.orderbook.cancel_timed_out_orders(3)
+        self.assertEqual(self.orderbook.get_bid_volume(10.0), 50)
+        self.assertEqual(self.orderbook.buys[10.0].orders[0].trader_id, 2)
+
+    def test_trade_log_grows_past_initial_capacity(self):
+        """成交日志超过初始容量后自动扩容，记录顺序与字段保持不变"""
+        log = TradeLog(capacity=2)
+        for i in range(5):
+            log.append(i, i + 10, i, 10.0 + i, 100)
+        self.assertEqual(len(log), 5)
+        self.assertEqual(list(log.records['buyer_id']), [0, 1, 2, 3, 4])
+        self.assertEqual(log[-1]['trade_price'], 14.0)
+        self.assertEqual(log[-1]['seller_id'], 14)
+
+    def test_trade_log_grows_from_zero_capacity(self):
+        """初始容量为 0 时首次写入也能扩容"""
+        log = TradeLog(capacity=0)
+        log.append(1, 2, 0, 10.0, 100)
+        self.assertEqual(len(log), 1)
+        self.assertEqual(log[0]['trade_qty'], 100)
+
+    def test_non_crossing_market_order_keeps_opposite_top(self):
+        """市价单价格不可成交时，对手方最优挂单保留在订单簿中"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.2))
+        self.orderbook.submit_order(self._order(2, OrderType.MARKET, OrderDirection.BUY, 50, 1, price=10.0))
+        self.assertEqual(len(self.orderbook.trade_log), 0)
+        self.assertEqual(self.orderbook.best_ask(), 10.2)
+        self.assertEqual(self.orderbook.best_bid(), 10.0)
+
+    def test_timeout_keeps_price_priority(self):
+        """撤销超时订单后，最优价仍取剩余挂单中的最优价格，扫单按价格顺序成交"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.0, max_wait_time=2))
+        self.orderbook.submit_order(self._order(2, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.3))
+        self.orderbook.submit_order(self._order(3, OrderType.LIMIT, OrderDirection.SELL, 100, 0, price=10.2))
+        self.orderbook.cancel_timed_out_orders(3)
+        self.assertEqual(self.orderbook.best_ask(), 10.2)
+
+        self.orderbook.submit_order(self._order(4, OrderType.MARKET, OrderDirection.BUY, 200, 3, price=10.3))
+        self.assertEqual([t['trade_price'] for t in self.orderbook.trade_log], [10.2, 10.3])
+
+    def test_depth_counts_same_price_orders_in_time_order(self):
+        """市场深度按价格-时间优先取前 levels 笔挂单"""
+        self.orderbook.submit_order(self._order(1, OrderType.LIMIT, OrderDirection.BUY, 100, 0, price=10.1))
+        for trader_id, quantity in ((2, 1), (3, 2), (4, 3)):
+            self.orderbook.submit_order(self._order(trader_id, OrderType.LIMIT, OrderDirection.BUY, quantity, 0, price=10.0))
+        self.orderbook.submit_order(self._order(5, OrderType.MARKET, OrderDirection.SELL, 100, 1, price=10.1))
+        self.assertEqual(self.orderbook.get_total_depth(levels=2)['bid_depth'], 3)
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,72 @@
+import math
+import unittest
+import numpy as np
+from src.traders._kernels import decide_order
+
+
+def _decide(expected_price, p_t=100.0, best_ask=np.nan, best_bid=np.nan, price_band=0.1,
+            sell_ratio=0.2, quantity_boost=1.0, cash=10000.0, stock=100):
+    """只用噪声项驱动预期价格：g1 = g2 = 0、n = 1、tau_i = 1 时预期价格即 p_t * exp(epsilon)"""
+    epsilon = math.log(expected_price / p_t) * (1 + 1e-6)
+    return decide_order(p_t, p_t, best_ask, best_bid, 0.0, epsilon, 0.0, 0.0, 1.0, 0.0, 1, 200,
+                        price_band, sell_ratio, quantity_boost, cash, stock)
+
+
+class TestDecideOrder(unittest.TestCase):
+
+    def test_expected_rise_buys_with_limit_below_expected_price(self):
+        direction, is_market, price, quantity = _decide(102.0)
+        self.assertEqual(direction, 1)
+        self.assertFalse(is_market)
+        self.assertEqual(price, round(102.0 * (1 - 0.02 * 0.5), 2))
+        # 买单数量 int(cash * 0.2 / p_t) 再按价格偏离放大
+        self.assertEqual(quantity, int(20 * (1 + abs(price - 100.0) / 100.0 * 2)))
+
+    def test_expected_fall_sells_with_limit_above_expected_price(self):
+        direction, is_market, price, quantity = _decide(98.0)
+        self.assertEqual(direction, -1)
+        self.assertFalse(is_market)
+        self.assertEqual(price, round(98.0 * (1 + 0.02 * 0.5), 2))
+        self.assertEqual(quantity, int(20 * (1 + abs(price - 100.0) / 100.0 * 2)))
+
+    def test_crossing_quote_becomes_market_order(self):
+        direction, is_market, price, _ = _decide(102.0, best_ask=101.0, best_bid=99.0)
+        self.assertEqual((direction, is_market, price), (1, True, 101.0))
+        direction, is_market, price, _ = _decide(98.0, best_ask=101.0, best_bid=99.0)
+        self.assertEqual((direction, is_market, price), (-1, True, 99.0))
+
+    def test_non_crossing_quote_stays_limit(self):
+        direction, is_market, _, _ = _decide(102.0, best_ask=103.0)
+        self.assertEqual((direction, is_market), (1, False))
+
+    def test_price_is_clamped_to_band_around_last_price(self):
+        # 预期价格 150：限价 150 * 0.75 = 112.5，被锚定在 p_t * (1 + band)
+        self.assertEqual(_decide(150.0)[2], 110.0)
+        self.assertEqual(_decide(150.0, price_band=0.05)[2], 105.0)
+        # 预期价格 50：限价 50 * 1.25 = 62.5，被锚定在 p_t * (1 - band)
+        self.assertEqual(_decide(50.0)[2], 90.0)
+
+    def test_small_deviation_does_not_trade(self):
+        self.assertEqual(_decide(100.04), (0, False, 0.0, 0))
+
+    def test_quantity_below_one_does_not_trade(self):
+        # 现金不足一股：买单数量为 0
+        self.assertEqual(_decide(102.0, cash=50.0), (0, False, 0.0, 0))
+        # 持仓过少：int(stock * sell_ratio) 为 0
+        self.assertEqual(_decide(98.0, stock=4), (0, False, 0.0, 0))
+
+    def test_sell_is_not_capped_by_cash(self):
+        # 现金为 0、持仓充足的交易者：卖单数量只由持仓决定
+        direction, _, price, quantity = _decide(98.0, cash=0.0, stock=1000)
+        self.assertEqual(direction, -1)
+        self.assertEqual(quantity, int(200 * (1 + abs(price - 100.0) / 100.0 * 2)))
+
+    def test_buy_is_capped_by_cash(self):
+        # 放大后的买单数量超过现金可买股数时被截断
+        direction, _, _, quantity = _decide(150.0, cash=1000.0, quantity_boost=10.0)
+        self.assertEqual(direction, 1)
+        self.assertEqual(quantity, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
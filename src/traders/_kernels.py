@@ -0,0 +1,71 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def decide_order(p_t, p_f, best_ask, best_bid, trend, epsilon,
+                 g1, g2, n, bias, tau_i, tau_f,
+                 price_band, sell_ratio, quantity_boost, cash, stock):
+    """
+    交易者决策核心：由预期收益推出方向、订单类型、价格与数量
+
+    Args:
+        best_ask / best_bid: 最优报价，缺失时传入 NaN
+        price_band: 价格锚定区间（相对 p_t 的比例）
+        sell_ratio: 卖出时动用的持仓比例
+        quantity_boost: 数量放大系数（被网暴的散户为 1.2，否则为 1.0）
+
+    Returns:
+        (direction, is_market, price, quantity)，direction 为 1 买 / -1 卖 / 0 不交易
+    """
+    expected_return = (
+        (g1 / tau_f) * np.log(p_f / p_t) +
+        g2 * trend +
+        n * epsilon +
+        bias
+    ) / (g1 + g2 + n + 1e-6)
+
+    expected_price = p_t * np.exp(expected_return * tau_i)
+
+    # 计算价格偏离程度
+    price_deviation = (expected_price - p_t) / p_t
+
+    # 如果价格偏离小于0.05%，不交易
+    if abs(price_deviation) < 0.0005:
+        return 0, False, 0.0, 0
+
+    # 决定订单类型和价格（先定价）；NaN 与任何数比较均为 False
+    direction = 1 if price_deviation > 0 else -1
+    is_market = False
+    if direction == 1:
+        if best_ask <= expected_price:
+            is_market = True
+            price = best_ask
+        else:
+            price = expected_price * (1 - abs(price_deviation) * 0.5)
+    else:
+        if best_bid >= expected_price:
+            is_market = True
+            price = best_bid
+        else:
+            price = expected_price * (1 + abs(price_deviation) * 0.5)
+
+    # 价格锚定：限制在p_t的±price_band区间
+    price = min(max(price, p_t * (1 - price_band)), p_t * (1 + price_band))
+    price = round(price, 2)
+
+    # 再根据锚定后的价格与p_t的偏离决定交易量
+    price_diff = abs(price - p_t) / p_t
+    if direction == 1:
+        base_quantity = int(cash * 0.2 / p_t)
+    else:
+        base_quantity = int(stock * sell_ratio)
+    quantity = int(base_quantity * (1 + price_diff * 2))
+    quantity = int(quantity * quantity_boost)
+    if direction == 1:
+        # 现金约束只作用于买单，卖单数量由持仓决定
+        quantity = min(quantity, int(cash / p_t))
+    if quantity < 1:
+        return 0, False, 0.0, 0
+
+    return direction, is_market, price, quantity
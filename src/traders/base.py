@@ -1,12 +1,36 @@
+import logging
 import numpy as np
 from abc import ABC, abstractmethod
-from src.order.orders import Order
+from src.order.orders import Order, OrderDirection, OrderType
 import copy
 
+# 决策过程走 logging，默认级别下不构造日志字符串
+logger = logging.getLogger(__name__)
+
+# 枚举成员绑定为模块级名字，构造订单时免去枚举类的属性查找
+_BUY, _SELL = OrderDirection.BUY, OrderDirection.SELL
+_MARKET, _LIMIT = OrderType.MARKET, OrderType.LIMIT
+
+# 交易者类型的整数编码，分析时按编码构造掩码（未知类型记为 -1）
+TRADER_TYPE_CODES = {'retail': 0, 'institutional': 1}
+
 class BaseTrader(ABC):
+    RETAIL = TRADER_TYPE_CODES['retail']
+    INSTITUTIONAL = TRADER_TYPE_CODES['institutional']
+
+    # 属性固定，不为每个交易者分配 __dict__；网暴模型写入的状态属性也在此声明
+    __slots__ = (
+        'trader_id', 'type', 'type_code', 'config', 'fundarmental_price', 'stock', 'cash',
+        'g1', 'g2', 'n', 'tau', 'emotion_bias', 'suppression', 'emotion_weight',
+        'is_bullied', 'exposure', 'resilience', 'bully_cooldown', 'is_natural_bully',
+        'is_attacker', 'neighbors', 'last_attack_strength', 'last_been_attacked', 'last_attackers',
+        '_tau_i', '_tau_f', '_noise_std', '_bully_noise_std',
+    )
+
     def __init__(self, trader_id: int, config: dict, trader_type: str):
         self.trader_id = trader_id
         self.type = trader_type
+        self.type_code = TRADER_TYPE_CODES.get(trader_type, -1)
         self.config = config
         self.fundarmental_price = config['fundamental_price']
         initial_stock_max = config[trader_type]["initial_stock_max"]
@@ -26,6 +50,12 @@ class BaseTrader(ABC):
         
         self.tau = config["reference_tau_f"] / (1 + self.g1 / (1 + self.g2))
 
+        # 决策时用到的常量在整个模拟中不变，构造时读取一次
+        self._tau_i = int(self.tau)
+        self._tau_f = config.get("reference_tau_f", 200)
+        self._noise_std = config.get("noise_std", 0.01)
+        self._bully_noise_std = self._noise_std * config.get("bully_noise_amplify", 3.0)
+
         # 网络暴力/情绪参数
         self.emotion_bias = np.random.normal(0, config.get("emotion_initial_bias", 0.01))
         self.suppression = np.random.normal(0, 1.0)
@@ -36,11 +66,18 @@ class BaseTrader(ABC):
         self.resilience = 0.0              # 抗压性（成长型）
         self.bully_cooldown = 0            # 喷子攻击后冷却时间
         self.is_natural_bully = False      # 是否天生喷子
+        self.is_attacker = False           # 当前是否为喷子（天生或被感染）
         self.neighbors = []                # trader 社交图中的邻居
 
     def copy(self) -> 'BaseTrader':
-        """创建交易者的深拷贝"""
-        return copy.deepcopy(self)
+        """
+        创建交易者的深拷贝。
+        邻居列表复制为新列表但保留对原邻居对象的引用，共享的只读配置不复制，
+        避免沿社交网络递归拷贝所有交易者
+        """
+        memo = {id(neighbor): neighbor for neighbor in self.neighbors}
+        memo[id(self.config)] = self.config
+        return copy.deepcopy(self, memo)
 
     def __repr__(self):
         return (f"<Trader {self.trader_id} ({self.type}) | "
@@ -48,6 +85,53 @@ class BaseTrader(ABC):
                 f"g1={self.g1:.2f}, g2={self.g2:.2f}, n={self.n:.2f}, tau={self.tau:.2f}> "
                 )
         
+    @staticmethod
+    def _recent_trend(market_snapshot: dict, tau_i: int) -> float:
+        """最近 tau_i 期对数收益率的均值（tau_i 为 0 时取全部历史，无历史时为 0）"""
+        sums = market_snapshot.get("log_return_sums")
+        if sums is None:
+            # 快照未提供前缀和时按收益率序列直接计算
+            returns = market_snapshot.get("log_returns", [])
+            recent_returns = returns[-tau_i:] if len(returns) >= tau_i else returns
+            return np.mean(recent_returns) if recent_returns else 0.0
+        n = len(sums) - 1
+        k = n if tau_i == 0 else min(tau_i, n)
+        if k == 0:
+            return 0.0
+        return (sums[n] - sums[n - k]) / k
+
+    def _build_order(self, timestep: int, direction: int, is_market: bool, quantity: int,
+                     price: float, max_wait_time: int) -> Order:
+        """按决策内核的输出构造订单（direction 为 1 买入、-1 卖出）"""
+        return Order(
+            trader_id=self.trader_id,
+            direction=_BUY if direction == 1 else _SELL,
+            order_type=_MARKET if is_market else _LIMIT,
+            quantity=quantity,
+            price=price,
+            timestep=timestep,
+            max_wait_time=max_wait_time
+        )
+
+    def _log_decision(self, direction: int, is_market: bool, quantity: int, price: float,
+                      p_t: float, p_f: float, best_ask, best_bid, tau_i: int):
+        """记录一次交易决策，仅在 DEBUG 级别启用时格式化"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug(
+            "%s Agent %s decided to trade: direction=%s quantity=%s price=%.2f type=%s | "
+            "price=%.2f fundamental=%.2f best_ask=%s best_bid=%s | "
+            "g1=%.2f g2=%.2f n=%.2f tau_i=%d stock=%s cash=%.2f%s",
+            self.type, self.trader_id, 'BUY' if direction == 1 else 'SELL', quantity, price,
+            'MARKET' if is_market else 'LIMIT', p_t, p_f,
+            best_ask if best_ask else 'N/A', best_bid if best_bid else 'N/A',
+            self.g1, self.g2, self.n, tau_i, self.stock, self.cash,
+            self._decision_log_extra())
+
+    def _decision_log_extra(self) -> str:
+        """子类追加在决策日志末尾的状态字段"""
+        return ""
+
     @abstractmethod
     def generate_order(self, timestep: int, market_snapshot: dict) -> Order:
         pass